@@ -2,7 +2,7 @@
 
 from django.test import TestCase
 
-from ..utils import remap_dict
+from ..utils import remap_dict, stream_json_list
 
 
 class TestUtils(TestCase):
@@ -22,3 +22,13 @@ class TestUtils(TestCase):
         new_dict = remap_dict(old_dict, {'a': 'new_a', 'b': 'new_b'})
 
         self.assertEqual(new_dict, {'new_a': 1, 'new_b': 1})
+
+    def test_stream_json_list(self):
+        objects = [{'a': 1}, {'b': 2}, {'c': 3}]
+
+        self.assertEqual(
+            ''.join(stream_json_list(objects, chunk_size=2)),
+            '[{"a": 1}, {"b": 2}, {"c": 3}]'
+        )
+
+        self.assertEqual(''.join(stream_json_list(iter([]))), '[]')
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import datetime
+import json
 
 from django.test import TestCase, Client
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from django.core.cache import cache
+from django.db import connection
 
 from localities.tests.model_factories import (
     LocalityF,
@@ -13,12 +17,15 @@ from localities.tests.model_factories import (
     ChangesetF
 )
 
+from localities.models import LocalityIndex
+
 from social_users.tests.model_factories import UserF
 
 
 class TestViews(TestCase):
     def setUp(self):
         self.client = Client()
+        cache.clear()
 
     def test_localities_api_view(self):
         user = UserF.create(id=1, username='test')
@@ -49,6 +56,117 @@ class TestViews(TestCase):
             u'uuid": "35570d8b22494bb6a88487a8108ffd68", "lnglat": "16,45"}]'
         )
 
+    @override_settings(API_STREAM_LOCALITIES=True)
+    def test_localities_api_view_streaming(self):
+        user = UserF.create(id=1, username='test')
+        chgset = ChangesetF.create(
+            social_user=user, created=datetime.datetime(2014, 11, 23, 12, 0)
+        )
+        dom = DomainF.create(name='test_domain', changeset=chgset)
+        LocalityF.create(
+            geom='POINT(16.9 45.4)', uuid='35570d8b22494bb6a88487a8108ffd69',
+            changeset=chgset, domain=dom
+        )
+
+        LocalityF.create(
+            geom='POINT(16 45)', uuid='35570d8b22494bb6a88487a8108ffd68',
+            changeset=chgset, domain=dom
+        )
+
+        resp = self.client.get(
+            reverse('api_localities'), {'bbox': '-180,-90,180,90'}
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/json')
+
+        self.assertEqual(
+            ''.join(resp.streaming_content),
+            u'[{"version": 1, "user_id": 1, "uuid": "35570d8b22494bb6a88487a81'
+            u'08ffd69", "lnglat": "16.9,45.4"}, {"version": 1, "user_id": 1, "'
+            u'uuid": "35570d8b22494bb6a88487a8108ffd68", "lnglat": "16,45"}]'
+        )
+
+    def test_localities_api_view_pages(self):
+        user = UserF.create(id=1, username='test')
+        chgset = ChangesetF.create(social_user=user)
+        for loc_id in (1, 2, 3):
+            LocalityF.create(
+                id=loc_id, geom='POINT(16 45)', changeset=chgset,
+                uuid='35570d8b22494bb6a88487a8108ffd6{}'.format(loc_id)
+            )
+
+        resp = self.client.get(
+            reverse('api_localities'), {'bbox': '-180,-90,180,90', 'limit': 2}
+        )
+
+        self.assertEqual(resp.status_code, 200)
+
+        page = json.loads(resp.content)
+        self.assertEqual(page['next'], 2)
+        self.assertEqual(page['localities'], [
+            {'version': 1, 'user_id': 1, 'lnglat': '16,45',
+                'uuid': '35570d8b22494bb6a88487a8108ffd61'},
+            {'version': 1, 'user_id': 1, 'lnglat': '16,45',
+                'uuid': '35570d8b22494bb6a88487a8108ffd62'}
+        ])
+
+        resp = self.client.get(reverse('api_localities'), {
+            'bbox': '-180,-90,180,90', 'limit': 2, 'cursor': page['next']
+        })
+
+        page = json.loads(resp.content)
+        self.assertEqual(page['next'], None)
+        self.assertEqual(
+            [loc['uuid'] for loc in page['localities']],
+            ['35570d8b22494bb6a88487a8108ffd63']
+        )
+
+    def test_localities_api_view_max_unpaged(self):
+        LocalityF.create()
+        LocalityF.create()
+
+        with self.settings(API_MAX_UNPAGED=2):
+            resp = self.client.get(
+                reverse('api_localities'), {'bbox': '-180,-90,180,90'}
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(json.loads(resp.content)), 2)
+
+        for stream in (False, True):
+            with self.settings(
+                    API_MAX_UNPAGED=1, API_STREAM_LOCALITIES=stream):
+                resp = self.client.get(
+                    reverse('api_localities'), {'bbox': '-180,-90,180,90'}
+                )
+
+            # too many Localities for a response without pages
+            self.assertEqual(resp.status_code, 400)
+
+    def test_localities_api_view_default_page_size(self):
+        LocalityF.create()
+
+        with self.settings(API_PAGE_SIZE=1):
+            resp = self.client.get(
+                reverse('api_localities'), {
+                    'bbox': '-180,-90,180,90', 'cursor': 0
+                }
+            )
+
+        page = json.loads(resp.content)
+        self.assertEqual(len(page['localities']), 1)
+        self.assertEqual(page['next'], None)
+
+    def test_localities_api_view_bad_page_params(self):
+        for params in ({'limit': 'a'}, {'cursor': 'a'}, {'limit': 0}, {
+                'limit': 10001}):
+            params.update({'bbox': '-180,-90,180,90'})
+            resp = self.client.get(reverse('api_localities'), params)
+
+            self.assertEqual(resp.status_code, 404)
+
     def test_localities_api_view_nodata(self):
         resp = self.client.get(
             reverse('api_localities'), {'bbox': '-180,-90,180,90'}
@@ -109,6 +227,31 @@ class TestViews(TestCase):
             u'l"}, "uuid": "35570d8b22494bb6a88487a8108ffd69", "changeset": 1}'
         )
 
+    def test_locality_api_view_etag(self):
+        loc = LocalityF.create(
+            geom='POINT(16.9 45.4)', uuid='35570d8b22494bb6a88487a8108ffd69'
+        )
+        url = reverse(
+            'api_locality', kwargs={'uuid': '35570d8b22494bb6a88487a8108ffd69'}
+        )
+
+        resp = self.client.get(url)
+        etag = resp['ETag']
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, 304)
+
+        # new Locality version has a new representation
+        loc.set_geom(16, 45)
+        loc.save()
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertIn('"geom": [16.0, 45.0]', resp.content)
+
     def test_locality_api_view_nodata(self):
         resp = self.client.get(
             reverse(
@@ -118,3 +261,266 @@ class TestViews(TestCase):
         )
 
         self.assertEqual(resp.status_code, 404)
+
+    def _index_locality(self, name, **kwargs):
+        loc = LocalityF.create(**kwargs)
+        LocalityIndex.objects.create(
+            locality=loc, ranka=name, rankb='', rankc='', rankd=''
+        )
+        return loc
+
+    def _create_search_data(self):
+        dom = DomainF.create(name='test_domain')
+
+        self._index_locality(
+            'Amsterdam Clinic', geom='POINT(16 45)', domain=dom,
+            uuid='35570d8b22494bb6a88487a8108ffd69'
+        )
+        self._index_locality(
+            'Athalia Clinic', geom='POINT(10 10)', domain=dom,
+            uuid='35570d8b22494bb6a88487a8108ffd68'
+        )
+        self._index_locality(
+            'Amsterdam Hospital', geom='POINT(16 45)',
+            uuid='35570d8b22494bb6a88487a8108ffd67'
+        )
+
+        # fts_index is updated by a trigger, which is not executed in tests
+        cursor = connection.cursor()
+        cursor.execute(
+            'UPDATE localities_localityindex SET fts_index = '
+            'setweight(to_tsvector(\'english\', ranka), \'A\')'
+        )
+
+    def test_search_api_view(self):
+        self._create_search_data()
+
+        resp = self.client.get(
+            reverse('api_search'), {'q': 'clinic', 'limit': 1}
+        )
+
+        self.assertEqual(resp.status_code, 200)
+
+        result = json.loads(resp.content)
+        self.assertEqual(result['next'], 2)
+        self.assertEqual(
+            [(loc['uuid'], loc['name'], loc['lnglat'])
+             for loc in result['localities']],
+            [(u'35570d8b22494bb6a88487a8108ffd69', u'Amsterdam Clinic',
+              u'16,45')]
+        )
+
+        resp = self.client.get(
+            reverse('api_search'), {'q': 'clinic', 'limit': 1, 'page': 2}
+        )
+
+        result = json.loads(resp.content)
+        self.assertEqual(result['next'], None)
+        self.assertEqual(
+            [loc['name'] for loc in result['localities']], [u'Athalia Clinic']
+        )
+
+    def test_search_api_view_filters(self):
+        self._create_search_data()
+
+        resp = self.client.get(
+            reverse('api_search'), {'q': 'hospital', 'domain': 'test_domain'}
+        )
+
+        self.assertEqual(json.loads(resp.content)['localities'], [])
+
+        resp = self.client.get(
+            reverse('api_search'), {'q': 'athalia', 'bbox': '15,44,17,46'}
+        )
+
+        self.assertEqual(json.loads(resp.content)['localities'], [])
+
+    def test_search_api_view_bad_params(self):
+        for params in ({}, {'q': ' '}, {'q': 'a', 'page': 0},
+                       {'q': 'a', 'limit': 'a'}, {'q': 'a', 'bbox': '1,2'}):
+            resp = self.client.get(reverse('api_search'), params)
+
+            self.assertEqual(resp.status_code, 404)
+
+    def test_autocomplete_api_view(self):
+        self._create_search_data()
+
+        resp = self.client.get(reverse('api_autocomplete'), {'q': 'am'})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            [loc['name'] for loc in json.loads(resp.content)],
+            [u'Amsterdam Clinic', u'Amsterdam Hospital']
+        )
+
+        # LIKE wildcards are escaped
+        resp = self.client.get(reverse('api_autocomplete'), {'q': '%'})
+
+        self.assertEqual(json.loads(resp.content), [])
+
+    def test_autocomplete_api_view_order(self):
+        self._index_locality('amsterdam Zoo')
+        self._index_locality('Amsterdam Airport')
+
+        resp = self.client.get(reverse('api_autocomplete'), {'q': 'am'})
+        result = json.loads(resp.content)
+
+        # Localities are ordered by name, ignoring the case
+        self.assertEqual(
+            [loc['name'] for loc in result],
+            [u'Amsterdam Airport', u'amsterdam Zoo']
+        )
+        # ordering key is not a part of the response
+        self.assertListEqual(
+            sorted(result[0].keys()), [u'lnglat', u'name', u'uuid']
+        )
+
+    def test_autocomplete_api_view_center(self):
+        self._create_search_data()
+
+        resp = self.client.get(
+            reverse('api_autocomplete'), {'q': 'A', 'center': '10,10'}
+        )
+
+        result = json.loads(resp.content)
+        self.assertEqual(result[0], {
+            u'uuid': u'35570d8b22494bb6a88487a8108ffd68',
+            u'name': u'Athalia Clinic', u'lnglat': u'10,10'
+        })
+        self.assertEqual(len(result), 3)
+
+    def test_autocomplete_api_view_bad_params(self):
+        for params in ({}, {'q': 'a', 'limit': 0}, {'q': 'a', 'limit': 51},
+                       {'q': 'a', 'center': '1'}, {'q': 'a', 'center': 'a,b'}):
+            resp = self.client.get(reverse('api_autocomplete'), params)
+
+            self.assertEqual(resp.status_code, 404)
+
+    def test_nearest_localities_api_view(self):
+        dom = DomainF.create(name='test_domain')
+
+        LocalityF.create(
+            geom='POINT(16 45)', uuid='35570d8b22494bb6a88487a8108ffd69',
+            domain=dom
+        )
+        LocalityF.create(
+            geom='POINT(16.1 45)', uuid='35570d8b22494bb6a88487a8108ffd68',
+            domain=dom
+        )
+        LocalityF.create(
+            geom='POINT(16.01 45)', uuid='35570d8b22494bb6a88487a8108ffd67'
+        )
+
+        resp = self.client.get(
+            reverse('api_localities_nearest'),
+            {'lng': 16.02, 'lat': 45, 'n': 2}
+        )
+
+        self.assertEqual(resp.status_code, 200)
+
+        result = json.loads(resp.content)
+        self.assertEqual(
+            [loc['uuid'] for loc in result], [
+                u'35570d8b22494bb6a88487a8108ffd67',
+                u'35570d8b22494bb6a88487a8108ffd69'
+            ]
+        )
+        self.assertAlmostEqual(result[0]['distance'], 788, delta=5)
+        self.assertItemsEqual(
+            result[0].keys(),
+            [u'uuid', u'lnglat', u'version', u'user_id', u'distance']
+        )
+
+        resp = self.client.get(
+            reverse('api_localities_nearest'),
+            {'lng': 16.02, 'lat': 45, 'domain': 'test_domain'}
+        )
+
+        self.assertEqual(
+            [loc['uuid'] for loc in json.loads(resp.content)], [
+                u'35570d8b22494bb6a88487a8108ffd69',
+                u'35570d8b22494bb6a88487a8108ffd68'
+            ]
+        )
+
+    def test_nearest_localities_api_view_high_latitude(self):
+        # planar KNN distance puts the northern Locality first (0.5 < 1
+        # degree), but a degree of longitude at 80N is only ~19km
+        LocalityF.create(
+            geom='POINT(0 80.5)', uuid='35570d8b22494bb6a88487a8108ffd69'
+        )
+        LocalityF.create(
+            geom='POINT(1 80)', uuid='35570d8b22494bb6a88487a8108ffd68'
+        )
+
+        resp = self.client.get(
+            reverse('api_localities_nearest'), {'lng': 0, 'lat': 80, 'n': 1}
+        )
+
+        result = json.loads(resp.content)
+        self.assertEqual(
+            [loc['uuid'] for loc in result],
+            [u'35570d8b22494bb6a88487a8108ffd68']
+        )
+        self.assertAlmostEqual(result[0]['distance'], 19400, delta=200)
+
+        resp = self.client.get(
+            reverse('api_localities_nearest'), {'lng': 0, 'lat': 80}
+        )
+
+        result = json.loads(resp.content)
+        self.assertEqual(
+            [loc['uuid'] for loc in result], [
+                u'35570d8b22494bb6a88487a8108ffd68',
+                u'35570d8b22494bb6a88487a8108ffd69'
+            ]
+        )
+        self.assertLess(result[0]['distance'], result[1]['distance'])
+
+    def test_nearest_localities_api_view_bad_params(self):
+        for params in ({}, {'lng': 16}, {'lng': 'a', 'lat': 45},
+                       {'lng': 190, 'lat': 45}, {'lng': 16, 'lat': 45, 'n': 0},
+                       {'lng': 16, 'lat': 45, 'n': 101}):
+            resp = self.client.get(reverse('api_localities_nearest'), params)
+
+            self.assertEqual(resp.status_code, 404)
+
+    def test_localities_api_view_spatial_filters(self):
+        LocalityF.create(
+            geom='POINT(16 45)', uuid='35570d8b22494bb6a88487a8108ffd69'
+        )
+        LocalityF.create(
+            geom='POINT(16.01 45)', uuid='35570d8b22494bb6a88487a8108ffd68'
+        )
+
+        resp = self.client.get(
+            reverse('api_localities'), {
+                'polygon': 'POLYGON ((15 44, 15 46, 16.005 46, 16.005 44, '
+                '15 44))'
+            }
+        )
+
+        self.assertEqual(
+            [loc['uuid'] for loc in json.loads(resp.content)],
+            [u'35570d8b22494bb6a88487a8108ffd69']
+        )
+
+        resp = self.client.get(
+            reverse('api_localities'), {
+                'bbox': '-180,-90,180,90', 'center': '16.02,45',
+                'radius': 500
+            }
+        )
+
+        self.assertEqual(
+            [loc['uuid'] for loc in json.loads(resp.content)],
+            [u'35570d8b22494bb6a88487a8108ffd68']
+        )
+
+    def test_localities_api_view_bad_spatial_filters(self):
+        for params in ({'polygon': 'POINT (0 0)'}, {'radius': 100},
+                       {'center': '1,2', 'radius': -1},
+                       {'center': '1', 'radius': 100}):
+            resp = self.client.get(reverse('api_localities'), params)
+
+            self.assertEqual(resp.status_code, 404)
@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 from django.conf.urls import patterns, url
 
-from .views import LocalitiesAPI, LocalityAPI
+from .views import (
+    LocalitiesAPI,
+    NearestLocalitiesAPI,
+    LocalityAPI,
+    SearchAPI,
+    AutocompleteAPI
+)
 
 urlpatterns = patterns(
     '',
@@ -9,8 +15,20 @@ urlpatterns = patterns(
         r'^localities$', LocalitiesAPI.as_view(),
         name='api_localities'
     ),
+    url(
+        r'^localities/nearest$', NearestLocalitiesAPI.as_view(),
+        name='api_localities_nearest'
+    ),
     url(
         r'^locality/(?P<uuid>\w{32})$', LocalityAPI.as_view(),
         name='api_locality'
+    ),
+    url(
+        r'^search$', SearchAPI.as_view(),
+        name='api_search'
+    ),
+    url(
+        r'^autocomplete$', AutocompleteAPI.as_view(),
+        name='api_autocomplete'
     )
 )
@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
+import json
+import itertools
+
+from django.core.serializers.json import DjangoJSONEncoder
 
 
 def remap_dict(old_dict, transform):
@@ -12,3 +16,28 @@ def remap_dict(old_dict, transform):
         else:
             new_dict.update({k: v})
     return new_dict
+
+
+def stream_json_list(objects, chunk_size=500):
+    """
+    Serialize an iterable of objects as a JSON list, chunk by chunk
+
+    Output is the same as when serializing the whole list at once
+    """
+
+    yield '['
+
+    objects = iter(objects)
+    separator = ''
+
+    while True:
+        chunk = list(itertools.islice(objects, chunk_size))
+        if not(chunk):
+            break
+
+        yield separator + ', '.join(
+            json.dumps(obj, cls=DjangoJSONEncoder) for obj in chunk
+        )
+        separator = ', '
+
+    yield ']'
@@ -2,56 +2,314 @@
 import logging
 LOG = logging.getLogger(__name__)
 
-from django.http import Http404
+from django.http import (
+    Http404, HttpResponseBadRequest, StreamingHttpResponse
+)
+from django.conf import settings
 from django.views.generic import View
 from django.views.generic.detail import SingleObjectMixin
 
 from braces.views import JSONResponseMixin
 
 from localities.models import Locality
-from localities.utils import parse_bbox
+from localities.utils import parse_bbox, server_side_iterator
+from localities.caching import CachedDetailMixin
+from localities.mixins import SpatialFilterMixin
 
-from .utils import remap_dict
+from .utils import remap_dict, stream_json_list
 
+# Locality fields in lists of Localities, and their names in JSON responses
+LOCALITY_FIELDS = (
+    'uuid', 'lnglat', 'version', 'changeset__social_user_id',
+    # 'changeset__created'
+)
+LOCALITY_TRANSFORM = {
+    'changeset__social_user_id': 'user_id'
+}
+
+
+class LocalitiesAPI(SpatialFilterMixin, JSONResponseMixin, View):
+    """
+    Returns JSON representation of Localities in a *bbox* and/or within
+    spatial filters of the *SpatialFilterMixin*
+
+    If a page is requested, using *limit* and/or *cursor* parameters,
+    Localities are paginated using keyset pagination and returned with a
+    *next* page cursor. Responses without pages are limited to
+    *API_MAX_UNPAGED* Localities
+    """
+
+    fields = LOCALITY_FIELDS
+    transform = LOCALITY_TRANSFORM
 
-class LocalitiesAPI(JSONResponseMixin, View):
     def _parse_request_params(self, request):
-        if not(all(param in request.GET for param in ['bbox'])):
-            raise Http404
+        filters = self._parse_spatial_filters(request)
+
+        if 'bbox' not in request.GET:
+            if not(filters):
+                # either bbox or a spatial filter is required
+                raise Http404
+
+            return (None, filters)
 
         try:
             bbox_poly = parse_bbox(request.GET.get('bbox'))
-        except:
+        except ValueError:
             # return 404 if any of parameters are missing or not parsable
             raise Http404
 
-        return bbox_poly
+        return (bbox_poly, filters)
+
+    def _parse_page_params(self, request):
+        try:
+            cursor = int(request.GET.get('cursor', 0))
+            limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+        except ValueError:
+            # return 404 if parameters are not parsable
+            raise Http404
+
+        if not(0 < limit <= settings.API_MAX_PAGE_SIZE):
+            raise Http404
+
+        return (cursor, limit)
+
+    def get_page(self, localities, cursor, limit):
+        """
+        Retrieve a page of Localities with an *id* greater than the *cursor*
+        """
+
+        # fetch one more Locality to check if there is a next page
+        page = list(
+            localities.filter(id__gt=cursor).order_by('id')
+            .values('id', *self.fields)[:limit + 1]
+        )
+        next_cursor = page[limit - 1]['id'] if len(page) > limit else None
+
+        object_list = []
+        for loc in page[:limit]:
+            # ids are only used as page cursors
+            del loc['id']
+            object_list.append(remap_dict(loc, self.transform))
+
+        return {'localities': object_list, 'next': next_cursor}
 
     def get(self, request, *args, **kwargs):
-        bbox = self._parse_request_params(request)
-        # iterate thorugh queryset and remap keys
-        transform = {
-            'changeset__social_user_id': 'user_id'
-        }
-        object_list = [
-            remap_dict(loc, transform)
-            for loc in Locality.objects.in_bbox(bbox)
+        bbox, filters = self._parse_request_params(request)
+
+        localities = Locality.objects.all()
+
+        if bbox:
+            localities = localities.in_bbox(bbox)
+
+        localities = (
+            self.apply_spatial_filters(localities, filters)
             .select_related('changeset')
             .get_lnglat()
-            .values(
-                'uuid', 'lnglat', 'version', 'changeset__social_user_id',
-                # 'changeset__created'
+        )
+
+        if 'limit' in request.GET or 'cursor' in request.GET:
+            cursor, limit = self._parse_page_params(request)
+            return self.render_json_response(
+                self.get_page(localities, cursor, limit)
+            )
+
+        max_unpaged = settings.API_MAX_UNPAGED
+        if localities.order_by()[max_unpaged:max_unpaged + 1].exists():
+            return HttpResponseBadRequest(
+                'More than {} Localities match the request, use limit and '
+                'cursor parameters to request pages'.format(max_unpaged),
+                content_type='text/plain'
             )
+
+        # iterate thorugh queryset and remap keys
+        localities = localities.values(*self.fields)
+
+        if settings.API_STREAM_LOCALITIES:
+            # serialize Localities while reading them from the database
+            return StreamingHttpResponse(
+                stream_json_list(
+                    remap_dict(loc, self.transform)
+                    for loc in server_side_iterator(localities)
+                ),
+                content_type='application/json'
+            )
+
+        object_list = [remap_dict(loc, self.transform) for loc in localities]
+
+        return self.render_json_response(object_list)
+
+
+class NearestLocalitiesAPI(JSONResponseMixin, View):
+    """
+    Returns JSON representation of *n* Localities closest to a point (*lng*,
+    *lat*), optionally in a *domain*, with their *distance* in meters
+    """
+
+    fields = LOCALITY_FIELDS
+    transform = LOCALITY_TRANSFORM
+    max_n = 100
+
+    def _parse_request_params(self, request):
+        try:
+            lng = float(request.GET['lng'])
+            lat = float(request.GET['lat'])
+            num = int(request.GET.get('n', 10))
+        except (KeyError, ValueError):
+            # return 404 if any of parameters are missing or not parsable
+            raise Http404
+
+        if not(-180 <= lng <= 180 and -90 <= lat <= 90):
+            raise Http404
+
+        if not(0 < num <= self.max_n):
+            raise Http404
+
+        return (lng, lat, num)
+
+    def get(self, request, *args, **kwargs):
+        lng, lat, num = self._parse_request_params(request)
+
+        localities = Locality.objects.all()
+
+        if 'domain' in request.GET:
+            localities = localities.filter(domain__name=request.GET['domain'])
+
+        localities = (
+            localities.get_lnglat().nearest(lng, lat, num)
+            .values('distance', *self.fields)[:num]
+        )
+
+        object_list = [
+            remap_dict(loc, self.transform) for loc in localities
         ]
 
         return self.render_json_response(object_list)
 
 
-class LocalityAPI(JSONResponseMixin, SingleObjectMixin, View):
+class LocalityAPI(
+        CachedDetailMixin, JSONResponseMixin, SingleObjectMixin, View):
     model = Locality
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
+    detail_prefix = 'api'
+
+    def get_queryset(self):
+        return Locality.objects.select_related('domain')
+
+    def get_detail(self):
+        return self.object.repr_dict()
+
+
+class SearchAPI(JSONResponseMixin, View):
+    """
+    Returns JSON representation of Localities which match a text query *q*,
+    ordered by rank
+
+    Localities can be filtered by a *bbox* and a *domain* name, results are
+    paginated using *page* and *limit* parameters
+    """
+
+    fields = ('uuid', 'localityindex__ranka', 'lnglat', 'rank')
+    transform = {
+        'localityindex__ranka': 'name'
+    }
+
+    def _parse_request_params(self, request):
+        query = request.GET.get('q', '').strip()
+
+        try:
+            page = int(request.GET.get('page', 1))
+            limit = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+
+            bbox = request.GET.get('bbox')
+            bbox_poly = parse_bbox(bbox) if bbox else None
+        except ValueError:
+            # return 404 if any of parameters are not parsable
+            raise Http404
+
+        if not(query) or page < 1:
+            raise Http404
+
+        if not(0 < limit <= settings.API_MAX_PAGE_SIZE):
+            raise Http404
+
+        return (query, bbox_poly, page, limit)
+
+    def get(self, request, *args, **kwargs):
+        query, bbox, page, limit = self._parse_request_params(request)
+
+        localities = Locality.objects.search(query)
+
+        if bbox:
+            localities = localities.in_bbox(bbox)
+
+        if 'domain' in request.GET:
+            localities = localities.filter(domain__name=request.GET['domain'])
+
+        offset = (page - 1) * limit
+
+        # fetch one more Locality to check if there is a next page
+        results = list(
+            localities.get_lnglat().order_by('-rank', 'id')
+            .values(*self.fields)[offset:offset + limit + 1]
+        )
+
+        return self.render_json_response({
+            'localities': [
+                remap_dict(loc, self.transform) for loc in results[:limit]
+            ],
+            'next': page + 1 if len(results) > limit else None
+        })
+
+
+class AutocompleteAPI(JSONResponseMixin, View):
+    """
+    Returns JSON representation of Localities which name starts with a prefix
+    *q*
+
+    Localities closer to an optional map *center* (lng,lat) are listed first
+    """
+
+    fields = ('uuid', 'name', 'lnglat')
+    max_limit = 50
+
+    def _parse_request_params(self, request):
+        prefix = request.GET.get('q', '').strip()
+
+        try:
+            limit = int(request.GET.get('limit', 10))
+
+            center = request.GET.get('center')
+            center = map(float, center.split(',')) if center else None
+        except ValueError:
+            # return 404 if any of parameters are not parsable
+            raise Http404
+
+        if not(prefix) or not(0 < limit <= self.max_limit):
+            raise Http404
+
+        if center is not None and len(center) != 2:
+            raise Http404
+
+        return (prefix, limit, center)
 
     def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        return self.render_json_response(self.object.repr_dict())
+        prefix, limit, center = self._parse_request_params(request)
+
+        localities = Locality.objects.autocomplete(prefix).get_lnglat()
+
+        if center:
+            localities = localities.order_by_distance(*center)
+            fields = self.fields + ('knn_distance',)
+        else:
+            localities = localities.order_by_name()
+            fields = self.fields + ('name_key',)
+
+        object_list = []
+        for loc in localities.values(*fields)[:limit]:
+            # ordering keys are not a part of the response
+            loc.pop('knn_distance', None)
+            loc.pop('name_key', None)
+            object_list.append(loc)
+
+        return self.render_json_response(object_list)
@@ -30,6 +30,59 @@ INSTALLED_APPS += (
 LOGIN_REDIRECT_URL = '/'
 LOGIN_URL = '/signin/'
 
+# Localities clustering backend for the map view:
+# 'python' - cluster Localities in the Django process
+# 'database' - aggregate clusters in PostGIS using grid snapping
+CLUSTER_BACKEND = 'python'
+
+# Precomputed cluster pyramid, used by the map view for the listed zoom levels
+# and icon sizes, build it using the 'build_cluster_pyramid' command
+CLUSTER_PYRAMID = False
+CLUSTER_PYRAMID_ZOOMS = range(0, 9)
+CLUSTER_PYRAMID_ICONSIZES = ((48, 46),)
+
+# Cluster Localities per map tile and cache tiles in the CLUSTER_TILE_CACHE,
+# tiles are invalidated when Localities change. CLUSTER_TILE_CACHE must be a
+# shared backend (e.g. memcached), invalidation in a per-process cache does
+# not reach other processes. Map views covered by more than
+# CLUSTER_TILE_MAX_TILES tiles are clustered without tiles
+CLUSTER_TILES = False
+CLUSTER_TILE_CACHE = 'default'
+CLUSTER_TILE_TIMEOUT = 60 * 60 * 24
+CLUSTER_TILE_MAX_TILES = 100
+
+# Localities vector tiles contain clusters, for the TILE_ICONSIZE, below the
+# TILE_POINTS_ZOOM level and Locality points otherwise
+TILE_POINTS_ZOOM = 9
+TILE_ICONSIZE = (48, 46)
+TILE_MAX_AGE = 60 * 5
+
+# Stream api/localities responses, memory usage doesn't depend on the bbox size
+API_STREAM_LOCALITIES = False
+
+# default and maximum number of Localities in an api/localities page, and
+# the maximum number of Localities in a response without pages, requests for
+# more Localities get a 400 response and should use pages
+API_PAGE_SIZE = 1000
+API_MAX_PAGE_SIZE = 10000
+API_MAX_UNPAGED = 10000
+
+# Locality detail representations are cached in the LOCALITY_DETAIL_CACHE,
+# cache keys change with every Locality change so a per-process cache never
+# serves stale details, a shared backend avoids building them per process
+LOCALITY_DETAIL_CACHE = 'default'
+LOCALITY_DETAIL_TIMEOUT = 60 * 60 * 24
+
+# Update LocalityIndex using a single SQL statement, which aggregates Values in
+# the database, instead of building it in the Django process
+LOCALITY_INDEX_SQL = False
+
+# Compressed dataset snapshots of every Domain, in SNAPSHOT_FORMATS, are
+# written to the SNAPSHOT_DIR of the MEDIA_ROOT by the 'build_snapshots'
+# command, along with a manifest.json
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_FORMATS = ('geojsonseq', 'csv')
+
 PIPELINE_JS = {
     'contrib': {
         'source_filenames': (
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.db import connection
+
+# archive objects, grouped by archive model, collected during
+# *deferred_archives*, and the savepoint depth of the block
+_pending = threading.local()
+
+
+def _savepoint_depth():
+    # atomic blocks without a savepoint are listed as None
+    return len([sid for sid in connection.savepoint_ids if sid])
+
+
+def save_archives(archives):
+    """
+    Save a list of archive objects using a bulk query per archive model
+
+    Within a *deferred_archives* block archives are collected and saved at the
+    end of the block. Archives created within a savepoint of a nested atomic
+    block are saved immediately, so they are rolled back with the savepoint
+    """
+
+    pending = getattr(_pending, 'archives', None)
+
+    if pending is not None and _savepoint_depth() != _pending.depth:
+        pending = None
+
+    grouped = pending if pending is not None else OrderedDict()
+
+    for archive in archives:
+        grouped.setdefault(archive.__class__, []).append(archive)
+
+    if pending is None:
+        _bulk_save(grouped)
+
+
+def save_archive(archive):
+    """
+    Save an archive object, or postpone it within a *deferred_archives* block
+    """
+
+    save_archives([archive])
+
+
+def _bulk_save(grouped):
+    for model, archives in grouped.iteritems():
+        LOG.debug('Saving %s %s objects', len(archives), model.__name__)
+        model.objects.bulk_create(archives)
+
+
+@contextmanager
+def deferred_archives():
+    """
+    Postpone saving of archive objects until the end of the block, so every
+    archive model is saved using a single query
+
+    The block should be used within a transaction, archives are not saved if
+    the block raises an exception. Archives created within nested atomic
+    blocks are not postponed
+    """
+
+    if getattr(_pending, 'archives', None) is not None:
+        # archives are already deferred by an outer block
+        yield
+        return
+
+    _pending.archives = OrderedDict()
+    _pending.depth = _savepoint_depth()
+    try:
+        yield
+        grouped = _pending.archives
+    finally:
+        _pending.archives = None
+
+    _bulk_save(grouped)
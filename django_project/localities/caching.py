@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import json
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+def detail_cache_key(prefix, locality):
+    """
+    Build a cache key for a Locality detail, based on Locality *uuid* and
+    *version*, the state of its Values and its Domain *version*
+
+    State of Values is the latest Changeset id and the number of Values,
+    retrieved using a single query, so every change of the Locality results
+    in a new key and cached details never have to be removed
+    """
+
+    values = locality.value_set.aggregate(
+        changeset=Max('changeset'), count=Count('id')
+    )
+
+    return 'localities:detail:{}:{}:{}:{}:{}:{}'.format(
+        prefix, locality.uuid, locality.version, values['changeset'],
+        values['count'], locality.domain.version
+    )
+
+
+def cached_detail(prefix, locality, build):
+    """
+    Retrieve a (payload, etag) tuple of a Locality detail from the cache
+
+    If the detail is not cached, payload is created using the *build*
+    function and etag is a hash of the payload
+    """
+
+    cache = caches[settings.LOCALITY_DETAIL_CACHE]
+    key = detail_cache_key(prefix, locality)
+
+    detail = cache.get(key)
+
+    if detail is None:
+        payload = build()
+        etag = hashlib.md5(
+            json.dumps(payload, sort_keys=True, cls=DjangoJSONEncoder)
+        ).hexdigest()
+
+        detail = (payload, etag)
+        cache.set(key, detail, settings.LOCALITY_DETAIL_TIMEOUT)
+
+    return detail
+
+
+class CachedDetailMixin(object):
+    """
+    Returns JSON representation of an object, which is cached until the
+    object changes, and supports conditional requests using ETags
+
+    Views define *detail_prefix* and *get_detail* which builds the
+    representation of *self.object*
+    """
+
+    detail_prefix = None
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        payload, etag = cached_detail(
+            self.detail_prefix, self.object, self.get_detail
+        )
+
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+
+        if etag in etags or '*' in etags:
+            # client already has the latest representation
+            response = HttpResponseNotModified()
+        else:
+            response = self.render_json_response(payload)
+
+        response['ETag'] = quote_etag(etag)
+
+        return response
@@ -6,3 +6,10 @@ class LocalityImportError(Exception):
     Locality import errors Exception
     """
     pass
+
+
+class LocalityExportError(Exception):
+    """
+    Locality export errors Exception
+    """
+    pass
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import json
+import itertools
+
+try:
+    from osgeo import ogr, osr
+except ImportError:
+    # GeoPackage export requires GDAL Python bindings
+    ogr = None
+
+from .models import Locality
+from .exceptions import LocalityExportError
+from .utils import server_side_iterator
+from ._csv_unicode import UnicodeDictWriter
+
+# GeoJSON text sequence record separator, RFC 8142
+RECORD_SEPARATOR = '\x1e'
+
+
+def domain_keys(domain):
+    """
+    List attribute keys of a Domain
+    """
+
+    return list(
+        domain.specification_set.order_by('id')
+        .values_list('attribute__key', flat=True)
+    )
+
+
+def domain_localities(domain, chunk_size=2000):
+    """
+    Iterate through every Locality of a Domain with its Values
+
+    Localities and Values are read using a single query and a server side
+    cursor, yielded features are dictionaries with *uuid*, *upstream_id*,
+    *version*, *geom* (lng, lat) and *values* (key: data)
+    """
+
+    rows = server_side_iterator(
+        Locality.objects.filter(domain=domain).get_lnglat().order_by('id')
+        .values(
+            'id', 'uuid', 'upstream_id', 'version', 'lnglat',
+            'value__specification__attribute__key', 'value__data'
+        ),
+        chunk_size=chunk_size
+    )
+
+    for _loc_id, loc_rows in itertools.groupby(rows, lambda x: x['id']):
+        loc_rows = list(loc_rows)
+        loc = loc_rows[0]
+
+        yield {
+            'uuid': loc['uuid'],
+            'upstream_id': loc['upstream_id'],
+            'version': loc['version'],
+            'geom': tuple(map(float, loc['lnglat'].split(','))),
+            'values': {
+                row['value__specification__attribute__key']: row['value__data']
+                for row in loc_rows
+                if row['value__specification__attribute__key'] is not None
+            }
+        }
+
+
+class GeoJSONSeqExporter(object):
+    """
+    Writes Localities as a GeoJSON text sequence, a Feature per line
+    """
+
+    def __init__(self, output, keys):
+        self.output = output
+        self.keys = keys
+
+    def write(self, feature):
+        properties = {key: feature['values'].get(key) for key in self.keys}
+        properties.update({
+            'uuid': feature['uuid'],
+            'upstream_id': feature['upstream_id'],
+            'version': feature['version']
+        })
+
+        self.output.write(RECORD_SEPARATOR)
+        json.dump({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point', 'coordinates': list(feature['geom'])
+            },
+            'properties': properties
+        }, self.output)
+        self.output.write('\n')
+
+    def close(self):
+        pass
+
+
+class CSVExporter(object):
+    """
+    Writes Localities as CSV rows, a column per attribute key
+    """
+
+    def __init__(self, output, keys):
+        self.keys = keys
+        self.writer = UnicodeDictWriter(
+            output, ['uuid', 'upstream_id', 'version', 'lng', 'lat'] + keys
+        )
+        self.writer.writeheader()
+
+    def write(self, feature):
+        row = {key: feature['values'].get(key, u'') for key in self.keys}
+        row.update({
+            'uuid': feature['uuid'],
+            'upstream_id': feature['upstream_id'] or u'',
+            'version': unicode(feature['version']),
+            'lng': unicode(feature['geom'][0]),
+            'lat': unicode(feature['geom'][1])
+        })
+
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class GeoPackageExporter(object):
+    """
+    Writes Localities to a GeoPackage layer, features are written in
+    transactions of *chunk_size* features
+    """
+
+    def __init__(self, filename, keys, layer_name='localities',
+                 chunk_size=1000):
+        if ogr is None:
+            raise LocalityExportError(
+                'GeoPackage export requires GDAL Python bindings'
+            )
+
+        self.keys = keys
+        self.chunk_size = chunk_size
+        self.count = 0
+
+        driver = ogr.GetDriverByName('GPKG')
+        self.datasource = driver.CreateDataSource(filename)
+        if self.datasource is None:
+            raise LocalityExportError(
+                'Can not create GeoPackage: {}'.format(filename)
+            )
+
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(4326)
+
+        self.layer = self.datasource.CreateLayer(
+            layer_name, srs, ogr.wkbPoint
+        )
+        for name in ['uuid', 'upstream_id', 'version'] + keys:
+            self.layer.CreateField(ogr.FieldDefn(name, ogr.OFTString))
+
+        self.layer.StartTransaction()
+
+    def write(self, feature):
+        ogr_feature = ogr.Feature(self.layer.GetLayerDefn())
+
+        for key, data in feature['values'].iteritems():
+            if key in self.keys:
+                ogr_feature.SetField(key, data.encode('utf-8'))
+
+        ogr_feature.SetField('uuid', feature['uuid'].encode('utf-8'))
+        if feature['upstream_id']:
+            ogr_feature.SetField(
+                'upstream_id', feature['upstream_id'].encode('utf-8')
+            )
+        ogr_feature.SetField('version', str(feature['version']))
+
+        point = ogr.Geometry(ogr.wkbPoint)
+        point.AddPoint_2D(*feature['geom'])
+        ogr_feature.SetGeometry(point)
+
+        self.layer.CreateFeature(ogr_feature)
+
+        self.count += 1
+        if self.count % self.chunk_size == 0:
+            self.layer.CommitTransaction()
+            self.layer.StartTransaction()
+
+    def close(self):
+        self.layer.CommitTransaction()
+        # closes the GeoPackage
+        self.datasource = None
+
+
+EXPORTERS = {
+    'geojsonseq': GeoJSONSeqExporter,
+    'csv': CSVExporter,
+    'gpkg': GeoPackageExporter
+}
+
+
+def export_localities(domain, exporter):
+    """
+    Write every Locality of a Domain using an exporter, returns the number of
+    exported Localities
+    """
+
+    count = 0
+
+    for feature in domain_localities(domain):
+        exporter.write(feature)
+        count += 1
+
+    exporter.close()
+
+    LOG.info('Exported %s Localities of %s', count, domain)
+
+    return count
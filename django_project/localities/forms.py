@@ -76,10 +76,9 @@ class LocalityForm(forms.Form):
 
         # Locality forms are special as they automatically collect initial data
         # based on the actual models
-        for value in locality.value_set.select_related('specification').all():
-            tmp_initial_data.update({
-                value.specification.attribute.key: value.data
-            })
+        tmp_initial_data.update(locality.value_set.values_list(
+            'specification__attribute__key', 'data'
+        ))
 
         # set initial form data
         kwargs.update({'initial': tmp_initial_data})
@@ -4,82 +4,77 @@ LOG = logging.getLogger(__name__)
 
 import uuid
 import json
+import zlib
+import time
+import itertools
+import multiprocessing
 
 from django.contrib.gis.geos import Point
-from django.db import transaction
+from django.db import transaction, connection
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 
-from .models import Locality, Domain, Changeset
+from .models import (
+    Locality, Domain, Changeset, Specification, Value, save_values
+)
 
 from .exceptions import LocalityImportError
 
 from ._csv_unicode import UnicodeDictReader
-
-
-class CSVImporter():
+from .pyramid import deferred_updates, update_localities
+from .tiles import invalidate_tiles
+from .indexing import update_locality_index
+from .signals import archive_localities
+from .archives import deferred_archives
+
+# number of parsed rows saved at once
+CHUNK_SIZE = 1000
+
+# coordinates closer than the tolerance (degrees) are considered unchanged
+GEOM_TOLERANCE = 1e-7
+
+# update geometry of many Localities using a single query
+LOCALITIES_UPDATE_SQL = """
+    UPDATE localities_locality AS loc
+    SET
+        geom = st_setsrid(st_makepoint(upd.geomx, upd.geomy), 4326),
+        version = upd.version, changeset_id = upd.changeset_id
+    FROM (VALUES {rows}) AS upd (id, geomx, geomy, version, changeset_id)
+    WHERE loc.id = upd.id
+"""
+
+
+def same_geom(geom, coords):
     """
-    CSV based importer
-
-    Importing a CSV/TSV files requires a:
-    * domain name - used to find all associated Specifications
-    * name of the source - used to distinguish upstream_ids
-    * csv filename
-    * attribute mapping file (JSON) - maps csv column names to specifications
+    Check if a point geometry is at (lon, lat) coordinates, within the
+    *GEOM_TOLERANCE*
     """
 
-    parsed_data = {}
+    return (
+        abs(geom.x - coords[0]) <= GEOM_TOLERANCE and
+        abs(geom.y - coords[1]) <= GEOM_TOLERANCE
+    )
 
-    def __init__(
-            self, domain_name, source_name, csv_filename, attr_json_file,
-            use_tabs=False):
-        self.domain_name = domain_name
-        self.source_name = source_name
-        self.csv_filename = csv_filename
 
-        self.use_tabs = use_tabs
-
-        with open(attr_json_file, 'rb') as attr_map_file:
-            self.attr_map = json.load(attr_map_file)
-
-        # import
-        self._get_domain()
-        self.parse_file()
+def row_partition(upstream_id, partitions):
+    """
+    Stable partition (index) of a row by its upstream_id, so every row with
+    the same upstream_id is parsed by the same worker process
+    """
 
-    def _get_domain(self):
-        """
-        Retrieves a domain from the database
-        """
+    checksum = zlib.crc32(upstream_id.encode('utf-8')) & 0xffffffff
 
-        try:
-            self.domain = Domain.objects.filter(name=self.domain_name).get()
-        except Domain.DoesNotExist:
-            msg = 'Domain "{}" does not exist'.format(self.domain_name)
-            LOG.error(msg)
-            raise LocalityImportError(msg)
+    return checksum % partitions
 
-    def _find_locality(self, uuid, upstream_id):
-        """
-        Tries to find a Locality in the database either by *uuid* or a
-        combination of *source_name* and *upstream_id*
 
-        If there are no results, just create a new Locality
-        """
+class RowParser(object):
+    """
+    Parses rows of a CSV file using an attribute mapping
+    """
 
-        try:
-            # try to find locality by uuid or upstream_id
-            loc = Locality.objects.filter(uuid=uuid).get()
-            LOG.debug('Found Locality by uuid: %s', uuid)
-            return (loc, False)
-        except Locality.DoesNotExist:
-            try:
-                loc = Locality.objects.filter(upstream_id=upstream_id).get()
-                LOG.debug('Found Locality by upstream_id: %s', upstream_id)
-                return (loc, False)
-            except Locality.DoesNotExist:
-                # create new Locality
-                loc = Locality()
-                LOG.debug('Creating a new Locality')
-                return (loc, True)
+    def __init__(self, source_name, attr_map):
+        self.source_name = source_name
+        self.attr_map = attr_map
 
     def _read_attr(self, row, attr):
         """
@@ -110,7 +105,7 @@ class CSVImporter():
 
     def parse_row(self, row_num, row_data):
         """
-        Parse row of data and add it to the *parsed_data* dictionary
+        Parse row of data, returns parsed row or None if the row is invalid
         """
 
         row_uuid = self._read_attr(row_data, self.attr_map['uuid'])
@@ -124,12 +119,6 @@ class CSVImporter():
 
         gen_upstream_id = u'{}¶{}'.format(self.source_name, row_upstream_id)
 
-        if gen_upstream_id in self.parsed_data:
-            LOG.error(
-                'Row %s with upstream_id: %s already exists, skipping...',
-                row_num, gen_upstream_id
-            )
-
         tmp_geom = self.parse_geom(
             row_data[self.attr_map['geom'][0]],
             row_data[self.attr_map['geom'][1]]
@@ -139,36 +128,152 @@ class CSVImporter():
             # skip this row
             return None
 
-        self.parsed_data.update({
-            gen_upstream_id: {
-                'uuid': row_uuid,
-                'upstream_id': gen_upstream_id,
-                'geom': tmp_geom,
-                'values': {
-                    key: self._read_attr(row_data, row_val)
-                    for key, row_val in self.attr_map['attributes'].iteritems()
-                    if self._read_attr(row_data, row_val) not in (None, '')
-                }
+        return {
+            'uuid': row_uuid,
+            'upstream_id': gen_upstream_id,
+            'geom': tmp_geom,
+            'values': {
+                key: self._read_attr(row_data, row_val)
+                for key, row_val in self.attr_map['attributes'].iteritems()
+                if self._read_attr(row_data, row_val) not in (None, '')
             }
-        })
+        }
+
+
+class CSVImporter():
+    """
+    CSV based importer
+
+    Importing a CSV/TSV files requires a:
+    * domain name - used to find all associated Specifications
+    * name of the source - used to distinguish upstream_ids
+    * csv filename
+    * attribute mapping file (JSON) - maps csv column names to specifications
+
+    Rows are parsed and saved in chunks of *chunk_size* rows, so memory usage
+    does not depend on the size of the file
+
+    In the *bulk* mode Localities, Values, their archives and LocalityIndex
+    are saved in chunks using bulk queries, which is much faster for large
+    files, but Django signals are not triggered for saved objects
+
+    With more than one of *workers* every worker process reads the file and
+    parses its own partition of rows (see *row_partition*), and every chunk
+    is saved in its own transaction
+
+    Parsed rows are compared with existing Localities and only new and
+    changed rows are saved, in the *dry_run* mode nothing is saved and only
+    *stats* are collected. Existing Localities which geometry did not change
+    are not saved, only their Values are updated
+    """
 
-    def save_localities(self):
+    def __init__(
+            self, domain_name, source_name, csv_filename, attr_json_file,
+            use_tabs=False, bulk=False, chunk_size=CHUNK_SIZE, workers=1,
+            dry_run=False):
+        self.domain_name = domain_name
+        self.source_name = source_name
+        self.csv_filename = csv_filename
+
+        self.use_tabs = use_tabs
+        self.bulk = bulk
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.dry_run = dry_run
+
+        # number of created, updated and unchanged rows, and updated rows
+        # which Locality was not saved as its geometry did not change
+        self.stats = {
+            'created': 0, 'updated': 0, 'unchanged': 0, 'geom_unchanged': 0
+        }
+
+        # number of saved rows and import duration (seconds)
+        self.row_count = 0
+        self.duration = None
+
+        # generated upstream_ids of parsed rows, used to detect duplicates
+        self.upstream_ids = set()
+
+        # Specification ids (key: spec_id) of every Domain
+        self.spec_ids = {}
+
+        with open(attr_json_file, 'rb') as attr_map_file:
+            self.attr_map = json.load(attr_map_file)
+
+        self.parser = RowParser(self.source_name, self.attr_map)
+
+        # import
+        self._get_domain()
+        self.parse_file()
+
+    def _get_domain(self):
         """
-        Save every locality in the parsed_data dictionary
+        Retrieves a domain from the database
+        """
+
+        try:
+            self.domain = Domain.objects.filter(name=self.domain_name).get()
+        except Domain.DoesNotExist:
+            msg = 'Domain "{}" does not exist'.format(self.domain_name)
+            LOG.error(msg)
+            raise LocalityImportError(msg)
+
+    def parse_row(self, row_num, row_data):
+        """
+        Parse row of data, returns parsed row or None if the row is skipped
+        """
+
+        return self.accept_row(
+            row_num, self.parser.parse_row(row_num, row_data)
+        )
+
+    def accept_row(self, row_num, row):
+        """
+        Check if a parsed row is not a duplicate of an already parsed row
+        """
+
+        if row is None:
+            return None
+
+        if row['upstream_id'] in self.upstream_ids:
+            LOG.error(
+                'Row %s with upstream_id: %s already exists, skipping...',
+                row_num, row['upstream_id']
+            )
+            # skip this row
+            return None
+
+        self.upstream_ids.add(row['upstream_id'])
+
+        return row
+
+    def _create_changeset(self):
+        """
+        Create a new changeset for the import, returns (user, changeset)
         """
 
-        # generate a new changeset id
         User = get_user_model()
 
         # TODO: use real user for import, at the moment we use a dummy user
         dummy_user = User.objects.get(pk=-1)
         tmp_changeset = Changeset.objects.create(social_user=dummy_user)
 
-        for gen_upstream_id, values in self.parsed_data.iteritems():
+        return dummy_user, tmp_changeset
+
+    def save_localities(self, changed_rows):
+        """
+        Save every locality in a chunk of (row, locality, values) tuples, as
+        returned by *diff_rows*
+        """
+
+        dummy_user, tmp_changeset = self.user, self.changeset
+
+        for values, loc, loc_values in changed_rows:
+            gen_upstream_id = values['upstream_id']
             row_uuid = values['uuid']
-            loc, _created = self._find_locality(row_uuid, gen_upstream_id)
 
-            if _created:
+            if loc is None:
+                loc = Locality()
                 loc.changeset = tmp_changeset
                 loc.domain = self.domain
                 loc.uuid = row_uuid or uuid.uuid4().hex  # gen new uuid if None
@@ -180,31 +285,431 @@ class CSVImporter():
                 LOG.info('Created %s (%s)', loc.uuid, loc.id)
 
                 # save values for Locality
-                loc.set_values(values['values'], social_user=dummy_user)
+                loc.set_values(
+                    values['values'], social_user=dummy_user,
+                    spec_ids=self._get_spec_ids(loc.domain_id), values={}
+                )
             else:
-                loc.changeset = tmp_changeset
-                loc.geom = Point(*values['geom'])
+                if same_geom(loc.geom, values['geom']):
+                    # only values changed, don't save the Locality
+                    self.stats['geom_unchanged'] += 1
+                else:
+                    loc.changeset = tmp_changeset
+                    loc.geom = Point(*values['geom'])
+
+                    loc.save()
+                    LOG.info('Updated %s (%s)', loc.uuid, loc.id)
+
+                loc.set_values(
+                    values['values'], social_user=dummy_user,
+                    spec_ids=self._get_spec_ids(loc.domain_id),
+                    values=loc_values
+                )
+
+    def bulk_save_localities(self, changed_rows):
+        """
+        Save every locality in a chunk of (row, locality, values) tuples, as
+        returned by *diff_rows*, using bulk queries
+        """
 
-                loc.save()
-                LOG.info('Updated %s (%s)', loc.uuid, loc.id)
-                loc.set_values(values['values'], social_user=dummy_user)
+        changeset = self.changeset
 
-    def parse_file(self):
+        localities, new_localities, points = self._bulk_save_geoms(
+            changed_rows, changeset
+        )
+        changed_localities = self._bulk_save_values(
+            changed_rows, localities, changeset
+        )
+
+        # new Localities are indexed even if they have no values
+        update_locality_index(
+            {loc.pk for loc in new_localities + changed_localities}
+        )
+
+        if points:
+            update_localities(points)
+            invalidate_tiles(points)
+
+        LOG.info('Saved a chunk of %s Localities', len(localities))
+
+    def diff_rows(self, rows):
+        """
+        Compare a chunk of parsed rows with existing Localities and their
+        Values, using bulk queries
+
+        Returns a list of (row, locality, values) tuples for new and changed
+        rows, where locality is None for new rows and values are Values
+        (spec_id: value) of the Locality, and updates *stats*. Save methods
+        reuse the loaded Localities and Values
+        """
+
+        localities = self.find_localities(rows)
+
+        values = {}
+        for value in Value.objects.filter(
+                locality_id__in=[loc.pk for loc in localities if loc]):
+            values.setdefault(value.locality_id, {})[
+                value.specification_id] = value
+
+        changed_rows = []
+
+        for row, loc in zip(rows, localities):
+            loc_values = values.get(loc.pk, {}) if loc else {}
+
+            if loc is None:
+                self.stats['created'] += 1
+            elif self._row_changed(row, loc, loc_values):
+                self.stats['updated'] += 1
+            else:
+                self.stats['unchanged'] += 1
+                continue
+
+            changed_rows.append((row, loc, loc_values))
+
+        return changed_rows
+
+    def _row_changed(self, row, loc, values):
+        """
+        Check if a parsed row changes geometry or Values (spec_id: value) of
+        an existing Locality
+        """
+
+        if not(same_geom(loc.geom, row['geom'])):
+            return True
+
+        spec_ids = self._get_spec_ids(loc.domain_id)
+
+        return any(
+            spec_ids[key] not in values or values[spec_ids[key]].data != data
+            for key, data in row['values'].iteritems() if key in spec_ids
+        )
+
+    def find_localities(self, rows):
+        """
+        Find Localities for a chunk of rows either by *uuid* or by
+        *upstream_id* using a single query
+
+        Returns Localities in the same order as rows, or None for rows without
+        a matching Locality
+        """
+
+        found = Locality.objects.select_related('domain').filter(
+            Q(uuid__in=[row['uuid'] for row in rows if row['uuid']]) |
+            Q(upstream_id__in=[row['upstream_id'] for row in rows])
+        )
+
+        by_uuid = {}
+        by_upstream_id = {}
+        for loc in found:
+            by_uuid[loc.uuid] = loc
+            by_upstream_id[loc.upstream_id] = loc
+
+        return [
+            by_uuid.get(row['uuid']) or by_upstream_id.get(row['upstream_id'])
+            for row in rows
+        ]
+
+    def _bulk_save_geoms(self, changed_rows, changeset):
         """
-        Open a file and parse rows
+        Create new and move existing Localities for a chunk of (row, locality,
+        values) tuples
 
-        All modifications to the database are going to be executed as a single
-        transaction to minimize inconsistent database state
+        Returns (localities, new_localities, points), Localities in the same
+        order as rows, created Localities and points (geomx, geomy) of created
+        and moved Localities
         """
 
-        with open(self.csv_filename, 'rb') as csv_file:
-            if self.use_tabs:
-                data_file = UnicodeDictReader(csv_file, delimiter='\t')
+        localities = []
+        new_localities = []
+        moved_localities = []
+        points = []
+
+        for row, loc, _values in changed_rows:
+            if loc is None:
+                loc = Locality(
+                    changeset=changeset, domain=self.domain,
+                    uuid=row['uuid'] or uuid.uuid4().hex,  # gen new uuid
+                    upstream_id=row['upstream_id'], geom=Point(*row['geom'])
+                )
+                new_localities.append(loc)
+            elif same_geom(loc.geom, row['geom']):
+                # only values changed, don't save the Locality
+                self.stats['geom_unchanged'] += 1
+                localities.append(loc)
+                continue
             else:
-                data_file = UnicodeDictReader(csv_file)
+                previous_geom = loc.geom
+                loc.geom = Point(*row['geom'])
+                loc.changeset = changeset
+                moved_localities.append(loc)
+                points.append((previous_geom.x, previous_geom.y))
+
+            loc.inc_version()
+            points.append(row['geom'])
+            localities.append(loc)
+
+        self._bulk_create_localities(new_localities)
+        self._bulk_update_localities(moved_localities)
+
+        archive_localities(new_localities + moved_localities)
+
+        for loc in new_localities + moved_localities:
+            loc.tracker.set_saved_fields()
+
+        return localities, new_localities, points
+
+    def _bulk_create_localities(self, localities):
+        """
+        Insert new Localities using a single query
+        """
+
+        if not(localities):
+            return
+
+        Locality.objects.bulk_create(localities)
+
+        # bulk_create does not set primary keys of created objects
+        new_ids = dict(
+            Locality.objects
+            .filter(upstream_id__in=[loc.upstream_id for loc in localities])
+            .values_list('upstream_id', 'id')
+        )
+        for loc in localities:
+            loc.pk = new_ids[loc.upstream_id]
+            LOG.info('Created %s (%s)', loc.uuid, loc.id)
+
+    def _bulk_update_localities(self, localities):
+        """
+        Update geometry of moved Localities using a single query
+        """
+
+        if not(localities):
+            return
+
+        cursor = connection.cursor()
+        cursor.execute(
+            LOCALITIES_UPDATE_SQL.format(
+                rows=', '.join(['(%s, %s, %s, %s, %s)'] * len(localities))
+            ),
+            list(itertools.chain.from_iterable(
+                (loc.pk, loc.geom.x, loc.geom.y, loc.version, loc.changeset.pk)
+                for loc in localities
+            ))
+        )
+
+        for loc in localities:
+            LOG.info('Updated %s (%s)', loc.uuid, loc.id)
+
+    def _get_spec_ids(self, domain_id):
+        """
+        Retrieve Specification ids (key: spec_id) of a Domain
+        """
+
+        if domain_id not in self.spec_ids:
+            self.spec_ids[domain_id] = dict(
+                Specification.objects
+                .filter(domain_id=domain_id)
+                .values_list('attribute__key', 'id')
+            )
+
+        return self.spec_ids[domain_id]
+
+    def _bulk_save_values(self, changed_rows, localities, changeset):
+        """
+        Create and update Values for a chunk of (row, locality, values) tuples
+        using bulk queries, *localities* are saved Localities of the rows
 
-            with transaction.atomic():
-                for r_num, r_data in enumerate(data_file):
-                    self.parse_row(r_num, r_data)
+        Returns a list of Localities with changed Values
+        """
+
+        changed_values = []
+        changed_localities = []
+
+        for (row, _loc, values), loc in zip(changed_rows, localities):
+            loc_values = loc.match_values(
+                row['values'], self._get_spec_ids(loc.domain_id), values
+            )
+
+            if loc_values:
+                changed_values.extend(loc_values)
+                changed_localities.append(loc)
+
+        if changed_values:
+            save_values(changed_values, changeset)
+
+        return changed_localities
+
+    def _read_file(self, csv_file):
+        if self.use_tabs:
+            return UnicodeDictReader(csv_file, delimiter='\t')
+        else:
+            return UnicodeDictReader(csv_file)
+
+    def in_partition(self, row_data, partition):
+        """
+        Check if a row belongs to a partition of *workers* partitions, rows
+        without an upstream_id belong to the first partition
+        """
+
+        upstream_id = self.parser._read_attr(
+            row_data, self.attr_map['upstream_id']
+        )
+        if not(upstream_id):
+            return partition == 0
+
+        return row_partition(upstream_id, self.workers) == partition
+
+    def parse_chunks(self, data_file, partition=None):
+        """
+        Parse rows of a file, or only rows of a *partition*, and yield lists
+        of at most *chunk_size* parsed rows
+        """
+
+        chunk = []
+
+        for r_num, r_data in enumerate(data_file):
+            if partition is not None and not(
+                    self.in_partition(r_data, partition)):
+                continue
+
+            row = self.parse_row(r_num, r_data)
+
+            if row is not None:
+                chunk.append(row)
+
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def _stage_partition(self, partition, queue):
+        """
+        Worker process, parse rows of a partition and put chunks of parsed
+        rows on the *queue*, followed by None when the partition is parsed
+
+        Workers never use the database connection inherited from the parent
+        process
+        """
+
+        try:
+            with open(self.csv_filename, 'rb') as csv_file:
+                for chunk in self.parse_chunks(
+                        self._read_file(csv_file), partition):
+                    queue.put(chunk)
+        finally:
+            queue.put(None)
+
+    def staged_chunks(self):
+        """
+        Parse rows using a worker process per partition and yield chunks of
+        parsed rows as they are staged by the workers
+
+        Numbers of failed workers are collected in *failed_workers*
+        """
+
+        # every worker stages at most a couple of chunks ahead
+        queue = multiprocessing.Queue(self.workers * 2)
+        processes = [
+            multiprocessing.Process(
+                target=self._stage_partition, args=(partition, queue)
+            )
+            for partition in range(self.workers)
+        ]
+        for process in processes:
+            process.start()
+
+        finished = False
+        try:
+            running = self.workers
+            while running:
+                chunk = queue.get()
+                if chunk is None:
+                    running -= 1
+                else:
+                    yield chunk
+            finished = True
+        finally:
+            for process in processes:
+                # workers are only stopped if saving of chunks failed
+                if not(finished):
+                    process.terminate()
+                process.join()
+
+        self.failed_workers = [
+            partition for partition, process in enumerate(processes)
+            if process.exitcode
+        ]
+
+    def save_chunks(self, chunks):
+        """
+        Save chunks of parsed rows, every chunk is saved in a transaction and
+        its archives are saved using bulk queries
+        """
+
+        if not(self.dry_run):
+            self.user, self.changeset = self._create_changeset()
+
+        for chunk in chunks:
+            changed_rows = self.diff_rows(chunk)
+            self.row_count += len(chunk)
+
+            if self.dry_run or not(changed_rows):
+                continue
+
+            with transaction.atomic(), deferred_archives():
                 # save localities to the database
-                self.save_localities()
+                if self.bulk:
+                    self.bulk_save_localities(changed_rows)
+                else:
+                    self.save_localities(changed_rows)
+
+    def parse_file(self):
+        """
+        Open a file, parse rows and save them in chunks
+
+        All modifications to the database are executed in a single
+        transaction, to minimize inconsistent database state. With more than
+        one of *workers* rows are parsed by worker processes and every chunk
+        is committed on its own. The cluster pyramid is updated once for all
+        of the imported Localities
+        """
+
+        start_time = time.time()
+        self.failed_workers = []
+
+        with deferred_updates():
+            if self.workers > 1:
+                self.save_chunks(self.staged_chunks())
+            else:
+                with open(self.csv_filename, 'rb') as csv_file:
+                    with transaction.atomic():
+                        self.save_chunks(
+                            self.parse_chunks(self._read_file(csv_file))
+                        )
+
+        self.duration = time.time() - start_time
+
+        if self.failed_workers:
+            # saved chunks are already committed, and the pyramid is updated
+            msg = 'Worker processes {} failed to parse rows'.format(
+                ', '.join(str(num) for num in self.failed_workers)
+            )
+            LOG.error(msg)
+            raise LocalityImportError(msg)
+
+        LOG.info(
+            'Imported %s rows in %.1f seconds (%.1f rows/sec)',
+            self.row_count, self.duration, self.throughput()
+        )
+
+    def throughput(self):
+        """
+        Number of imported rows per second
+        """
+
+        if not(self.duration):
+            return 0.0
+
+        return self.row_count / self.duration
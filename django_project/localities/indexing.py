@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+from django.db import connection
+
+# update or create LocalityIndex rows from ranked Values in a single statement,
+# fts_index is updated by the LocalityIndex trigger
+LOCALITY_INDEX_SQL = """
+    WITH ranks AS (
+        SELECT
+            loc.id AS locality_id,
+            coalesce(string_agg(
+                CASE WHEN spec.fts_rank = 'A' THEN val.data END, ' '
+                ORDER BY val.id
+            ), '') AS ranka,
+            coalesce(string_agg(
+                CASE WHEN spec.fts_rank = 'B' THEN val.data END, ' '
+                ORDER BY val.id
+            ), '') AS rankb,
+            coalesce(string_agg(
+                CASE WHEN spec.fts_rank = 'C' THEN val.data END, ' '
+                ORDER BY val.id
+            ), '') AS rankc,
+            coalesce(string_agg(
+                CASE WHEN spec.fts_rank = 'D' THEN val.data END, ' '
+                ORDER BY val.id
+            ), '') AS rankd
+        FROM localities_locality loc
+        LEFT JOIN localities_value val ON val.locality_id = loc.id
+        LEFT JOIN localities_specification spec
+            ON spec.id = val.specification_id
+        WHERE loc.id = ANY(%(ids)s)
+        GROUP BY loc.id
+    ), updated AS (
+        UPDATE localities_localityindex ind
+        SET
+            ranka = ranks.ranka, rankb = ranks.rankb,
+            rankc = ranks.rankc, rankd = ranks.rankd
+        FROM ranks
+        WHERE ind.locality_id = ranks.locality_id
+        RETURNING ind.locality_id
+    )
+    INSERT INTO localities_localityindex (
+        locality_id, ranka, rankb, rankc, rankd
+    )
+    SELECT locality_id, ranka, rankb, rankc, rankd
+    FROM ranks
+    WHERE locality_id NOT IN (SELECT locality_id FROM updated)
+"""
+
+
+def update_locality_index(locality_ids):
+    """
+    Update or create LocalityIndex of many Localities using a single query
+    """
+
+    locality_ids = list(locality_ids)
+
+    if not(locality_ids):
+        return
+
+    LOG.debug('Updating LocalityIndex for %s Localities', len(locality_ids))
+
+    cursor = connection.cursor()
+    cursor.execute(LOCALITY_INDEX_SQL, {'ids': locality_ids})
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand
+
+from ...pyramid import build_pyramid
+
+
+class Command(BaseCommand):
+
+    help = 'Build precomputed Locality cluster pyramid'
+
+    def handle(self, *args, **options):
+
+        build_pyramid()
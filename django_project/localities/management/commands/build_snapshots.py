@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from ...snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+
+    help = 'Build compressed dataset snapshots of Domains which have changed '\
+        'since the previous build'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--force', action='store_true', dest='force', default=False,
+            help='Rebuild snapshots of every Domain'
+        ),
+    )
+
+    def handle(self, *args, **options):
+
+        exported = build_snapshots(options['force'])
+
+        self.stdout.write(
+            'Built snapshots of {} Domains'.format(len(exported))
+        )
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Domain
+from ...exceptions import LocalityExportError
+from ...exporters import EXPORTERS, domain_keys, export_localities
+
+
+class Command(BaseCommand):
+
+    args = '<domain_name> <filename>'
+    help = 'Export Localities of a Domain as GeoJSON text sequence, CSV or '\
+        'GeoPackage'
+
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--format', type='choice', dest='format', default='geojsonseq',
+            choices=sorted(EXPORTERS.keys()),
+            help='Output format: geojsonseq (default), csv or gpkg'
+        ),
+    )
+
+    def handle(self, *args, **options):
+
+        if len(args) != 2:
+            raise CommandError('Missing required arguments')
+
+        domain_name = args[0]
+        filename = args[1]
+
+        try:
+            domain = Domain.objects.get(name=domain_name)
+        except Domain.DoesNotExist:
+            raise CommandError(
+                'Domain "{}" does not exist'.format(domain_name)
+            )
+
+        exporter_class = EXPORTERS[options['format']]
+        keys = domain_keys(domain)
+
+        try:
+            if options['format'] == 'gpkg':
+                # GeoPackage is written by GDAL, which opens the file itself
+                count = export_localities(
+                    domain, exporter_class(filename, keys)
+                )
+            else:
+                with open(filename, 'wb') as output:
+                    count = export_localities(
+                        domain, exporter_class(output, keys)
+                    )
+        except LocalityExportError as e:
+            raise CommandError(e.message)
+
+        self.stdout.write('Exported {} Localities'.format(count))
@@ -3,7 +3,7 @@ from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
 
-from ...importers import CSVImporter
+from ...importers import CSVImporter, CHUNK_SIZE
 
 
 class Command(BaseCommand):
@@ -16,6 +16,23 @@ class Command(BaseCommand):
             '--tabs', action='store_true', dest='use_tabs', default=False,
             help='Use when input file is tab delimited'
         ),
+        make_option(
+            '--bulk', action='store_true', dest='bulk', default=False,
+            help='Save Localities in chunks using bulk queries'
+        ),
+        make_option(
+            '--chunk-size', type='int', dest='chunk_size', default=CHUNK_SIZE,
+            help='Number of rows saved at once'
+        ),
+        make_option(
+            '--workers', type='int', dest='workers', default=1,
+            help='Number of processes parsing rows, every chunk is saved in '
+            'its own transaction when greater than 1'
+        ),
+        make_option(
+            '--dry-run', action='store_true', dest='dry_run', default=False,
+            help='Compare the file with existing Localities without saving'
+        ),
     )
 
     def handle(self, *args, **options):
@@ -28,7 +45,33 @@ class Command(BaseCommand):
         csv_filename = args[2]
         attr_map_file = args[3]
 
-        CSVImporter(
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be at least 1')
+
+        if options['workers'] < 1:
+            raise CommandError('Number of workers must be at least 1')
+
+        importer = CSVImporter(
             domain_name, source_name, csv_filename, attr_map_file,
-            options["use_tabs"]
+            options["use_tabs"], options["bulk"], options["chunk_size"],
+            options["workers"], options["dry_run"]
+        )
+
+        if options['dry_run']:
+            self.stdout.write('Dry run, no changes were saved')
+            action = 'Compared'
+        else:
+            action = 'Imported'
+
+        self.stdout.write(
+            'Created: {created}, updated: {updated} (geometry unchanged: '
+            '{geom_unchanged}), unchanged: {unchanged}'
+            .format(**importer.stats)
+        )
+
+        self.stdout.write(
+            '{} {} rows in {:.1f} seconds ({:.1f} rows/sec)'.format(
+                action, importer.row_count, importer.duration,
+                importer.throughput()
+            )
         )
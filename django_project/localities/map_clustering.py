@@ -4,6 +4,10 @@ LOG = logging.getLogger(__name__)
 
 import math
 
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+
 
 def within_bbox(bbox, geomx, geomy):
     """
@@ -34,6 +38,20 @@ def overlapping_area(zoom, pix_x, pix_y, lat):
     return (lng_deg, lat_deg)
 
 
+def catchment_bbox(geomx, geomy, zoom, pix_x, pix_y):
+    """
+    Calculate a cluster 'catchment' area (minx, miny, maxx, maxy) around a
+    point (geomx, geomy)
+    """
+
+    x_range, y_range = overlapping_area(zoom, pix_x, pix_y, geomy)
+
+    return (
+        geomx - x_range*1.5, geomy - y_range*1.5,
+        geomx + x_range*1.5, geomy + y_range*1.5
+    )
+
+
 def update_minbbox(point, minbbox):
     """
     For every cluster we are calculating minimum bbox for Localities in the
@@ -57,6 +75,65 @@ def update_minbbox(point, minbbox):
     return new_minbbox
 
 
+def cluster_cell_size(zoom, pix_x, pix_y):
+    """
+    Calculate size (lng_deg, lat_deg) of a clustering grid cell
+
+    A grid cell is as large as the biggest cluster 'catchment' area, which is
+    at the equator, so a point can only be in the catchment area of clusters
+    from its own or directly neighbouring grid cells
+    """
+
+    x_range, y_range = overlapping_area(zoom, pix_x, pix_y, 0)
+
+    return (x_range * 3, y_range * 3)
+
+
+def grid_cell(geomx, geomy, cell_size):
+    """
+    Calculate grid cell (column, row) index of a point (geomx, geomy)
+    """
+
+    return (
+        int(math.floor(geomx / cell_size[0])),
+        int(math.floor(geomy / cell_size[1]))
+    )
+
+
+def cell_extent(cell, cell_size):
+    """
+    Calculate extent (minx, miny, maxx, maxy) of a grid cell (column, row)
+    """
+
+    return (
+        cell[0] * cell_size[0], cell[1] * cell_size[1],
+        (cell[0] + 1) * cell_size[0], (cell[1] + 1) * cell_size[1]
+    )
+
+
+def find_cluster(grid, cell, geomx, geomy):
+    """
+    Find a cluster, in the cell and its neighbouring cells, that contains the
+    point (geomx, geomy) in its 'catchment' area
+
+    If there are multiple candidates, the oldest cluster is returned in order
+    to preserve results of a sequential scan through all of the clusters
+    """
+
+    candidates = [
+        pt
+        for col in (cell[0] - 1, cell[0], cell[0] + 1)
+        for row in (cell[1] - 1, cell[1], cell[1] + 1)
+        for pt in grid.get((col, row), ())
+        if within_bbox(pt[1]['bbox'], geomx, geomy)
+    ]
+
+    if candidates:
+        return min(candidates)[1]
+
+    return None
+
+
 def cluster(query_set, zoom, pix_x, pix_y):
     """
     Walk though a set of Localities and create point clusters
@@ -66,37 +143,131 @@ def cluster(query_set, zoom, pix_x, pix_y):
 
     If a point is within a cluster 'catchment' area increase point count for
     that cluster and recalculate clusters minimum bbox
+
+    Clusters are bucketed in a grid (spatial hash) of *cluster_cell_size*
+    cells, so every point is checked only against clusters from neighbouring
+    cells instead of against every existing cluster
     """
 
     cluster_points = []
+    grid = {}
+
+    cell_size = cluster_cell_size(zoom, pix_x, pix_y)
 
     localites = query_set.get_lnglat().values('id', 'uuid', 'lnglat')
 
     for locality in localites.iterator():
         geomx, geomy = map(float, locality['lnglat'].split(','))
 
-        # check every point in cluster_points
-        for pt in cluster_points:
-            if within_bbox(pt['bbox'], geomx, geomy):
-                # it's in the cluster 'catchment' area
-                pt['count'] += 1
-                pt['minbbox'] = update_minbbox((geomx, geomy), pt['minbbox'])
-                break
+        if all(cell_size):
+            cell = grid_cell(geomx, geomy, cell_size)
+            pt = find_cluster(grid, cell, geomx, geomy)
+        else:
+            # icon has no size, points can't be clustered
+            cell = None
+            pt = None
+
+        if pt:
+            # it's in the cluster 'catchment' area
+            pt['count'] += 1
+            pt['minbbox'] = update_minbbox((geomx, geomy), pt['minbbox'])
 
         else:
             # point is not in the catchment area of any cluster
-            x_range, y_range = overlapping_area(zoom, pix_x, pix_y, geomy)
-
-            bbox = (
-                geomx - x_range*1.5, geomy - y_range*1.5,
-                geomx + x_range*1.5, geomy + y_range*1.5
-            )
-            cluster_points.append({
+            new_cluster = {
                 'uuid': locality['uuid'],
                 'count': 1,
                 'geom': (geomx, geomy),
-                'bbox': bbox,
+                'bbox': catchment_bbox(geomx, geomy, zoom, pix_x, pix_y),
                 'minbbox': (geomx, geomy, geomx, geomy)
-            })
+            }
+            # index of the cluster defines its order of creation
+            grid.setdefault(cell, []).append(
+                (len(cluster_points), new_cluster)
+            )
+            cluster_points.append(new_cluster)
 
     return cluster_points
+
+
+# every cluster is represented by its first Locality, grid cells are
+# calculated the same way as by *grid_cell*
+DATABASE_CLUSTER_SQL = """
+    SELECT
+        floor(st_x(loc.geom) / %s)::integer,
+        floor(st_y(loc.geom) / %s)::integer,
+        (array_agg(loc.uuid ORDER BY loc.id))[1],
+        count(*),
+        (array_agg(st_x(loc.geom) ORDER BY loc.id))[1],
+        (array_agg(st_y(loc.geom) ORDER BY loc.id))[1],
+        min(st_x(loc.geom)), min(st_y(loc.geom)),
+        max(st_x(loc.geom)), max(st_y(loc.geom))
+    FROM localities_locality loc
+    WHERE loc.id IN ({localities})
+    GROUP BY 1, 2
+    ORDER BY min(loc.id)
+"""
+
+
+def database_cluster(query_set, zoom, pix_x, pix_y):
+    """
+    Create point clusters for a set of Localities using the database
+
+    Localities are grouped by cells of a grid of *cluster_cell_size* cells,
+    so only a single row per cluster is transferred from the database
+
+    Catchment area of a cluster is its grid cell, which contains every
+    Locality of the cluster
+    """
+
+    cell_x, cell_y = cluster_cell_size(zoom, pix_x, pix_y)
+
+    if not(cell_x and cell_y):
+        # icon has no size, points can't be clustered
+        return cluster(query_set, zoom, pix_x, pix_y)
+
+    localities_sql, params = query_set.values('id').query.sql_with_params()
+
+    cursor = connection.cursor()
+    cursor.execute(
+        DATABASE_CLUSTER_SQL.format(localities=localities_sql),
+        (cell_x, cell_y) + tuple(params)
+    )
+
+    cluster_points = []
+
+    for row in cursor.fetchall():
+        loc_uuid, count, geomx, geomy = row[2:6]
+
+        cluster_points.append({
+            'uuid': loc_uuid,
+            'count': count,
+            'geom': (geomx, geomy),
+            'bbox': cell_extent(row[:2], (cell_x, cell_y)),
+            'minbbox': list(row[6:])
+        })
+
+    return cluster_points
+
+
+CLUSTER_BACKENDS = {
+    'python': cluster,
+    'database': database_cluster
+}
+
+
+def get_cluster_backend():
+    """
+    Return a clustering function selected by the *CLUSTER_BACKEND* setting
+    """
+
+    backend = getattr(settings, 'CLUSTER_BACKEND', 'python')
+
+    try:
+        return CLUSTER_BACKENDS[backend]
+    except KeyError:
+        raise ImproperlyConfigured(
+            'Unknown CLUSTER_BACKEND "{}", valid choices are: {}'.format(
+                backend, ', '.join(sorted(CLUSTER_BACKENDS))
+            )
+        )
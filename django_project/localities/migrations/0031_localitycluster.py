@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.contrib.gis.db.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localities', '0030_auto_20141114_1548'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocalityCluster',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('zoom', models.IntegerField()),
+                ('pix_x', models.IntegerField()),
+                ('pix_y', models.IntegerField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('uuid', models.TextField()),
+                ('count', models.IntegerField()),
+                ('geom', django.contrib.gis.db.models.fields.PointField(srid=4326)),
+                ('minbbox_minx', models.FloatField()),
+                ('minbbox_miny', models.FloatField()),
+                ('minbbox_maxx', models.FloatField()),
+                ('minbbox_maxy', models.FloatField()),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='localitycluster',
+            unique_together=set([('zoom', 'pix_x', 'pix_y', 'cell_x', 'cell_y')]),
+        ),
+    ]
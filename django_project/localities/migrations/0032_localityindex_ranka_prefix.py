@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localities', '0031_localitycluster'),
+    ]
+
+    operations = [
+        # prefix index for Locality name autocomplete
+        migrations.RunSQL(
+            'CREATE INDEX localities_localityindex_ranka_prefix '
+            'ON localities_localityindex (lower(ranka) text_pattern_ops);',
+            'DROP INDEX localities_localityindex_ranka_prefix;'
+        ),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('localities', '0032_localityindex_ranka_prefix'),
+    ]
+
+    operations = [
+        # C collation index serves both prefix LIKE filters and ordering by
+        # name, text_pattern_ops index can not be used for ORDER BY
+        migrations.RunSQL(
+            'DROP INDEX localities_localityindex_ranka_prefix;',
+            'CREATE INDEX localities_localityindex_ranka_prefix '
+            'ON localities_localityindex (lower(ranka) text_pattern_ops);'
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX localities_localityindex_ranka_prefix '
+            'ON localities_localityindex '
+            '(lower(ranka) COLLATE "C", locality_id);',
+            'DROP INDEX localities_localityindex_ranka_prefix;'
+        ),
+    ]
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+from django.http import Http404
+from django.contrib.gis.geos import GEOSException
+
+from .utils import parse_polygon
+
+
+class SpatialFilterMixin(object):
+    """
+    Parses optional spatial filters of Localities, *polygon* (GeoJSON, WKT or
+    an encoded polyline) and *radius* (meters) around a *center* (lng,lat)
+    """
+
+    def _parse_spatial_filters(self, request):
+        """
+        Returns a list of functions which filter a Localities queryset, any
+        error during parsing will raise Http404 exception
+        """
+
+        filters = []
+
+        try:
+            if 'polygon' in request.GET:
+                polygon = parse_polygon(request.GET['polygon'])
+                filters.append(lambda qs: qs.within_polygon(polygon))
+
+            if 'radius' in request.GET:
+                lng, lat = map(float, request.GET['center'].split(','))
+                radius = float(request.GET['radius'])
+
+                if not(-180 <= lng <= 180 and -90 <= lat <= 90 and radius > 0):
+                    raise ValueError
+
+                filters.append(lambda qs: qs.within_radius(lng, lat, radius))
+        except (KeyError, ValueError, TypeError, GEOSException):
+            # return 404 if any of parameters are missing or not parsable
+            raise Http404
+
+        return filters
+
+    def apply_spatial_filters(self, queryset, filters):
+        """
+        Filter a Localities queryset using parsed spatial filters
+        """
+
+        for spatial_filter in filters:
+            queryset = spatial_filter(queryset)
+
+        return queryset
@@ -8,6 +8,7 @@ from django.utils import timezone
 from django.utils.text import slugify
 from django.contrib.gis.db import models
 from django.conf import settings
+from django.db import connection
 
 from django.contrib.contenttypes.fields import GenericForeignKey
 
@@ -16,6 +17,14 @@ from pg_fts.fields import TSVectorField
 
 from .querysets import PassThroughGeoManager, LocalitiesQuerySet
 
+# update data of many Values using a single query
+VALUES_UPDATE_SQL = """
+    UPDATE localities_value AS val
+    SET data = upd.data, version = upd.version, changeset_id = upd.changeset_id
+    FROM (VALUES {rows}) AS upd (id, data, version, changeset_id)
+    WHERE val.id = upd.id
+"""
+
 
 class ChangesetMixin(models.Model):
     """
@@ -170,65 +179,74 @@ class Locality(UpdateMixin, ChangesetMixin):
         self.geom.set_x(lon)
         self.geom.set_y(lat)
 
-    def set_values(self, changed_data, social_user):
+    def set_values(self, changed_data, social_user, spec_ids=None,
+                   values=None):
         """
         Set values for a Locality which are defined by Specifications
 
+        Existing values are retrieved using a single query, and changed values
+        and their archives are written using bulk queries. Callers which
+        already loaded Specification ids (key: spec_id) and existing Values
+        (spec_id: value) can pass them as *spec_ids* and *values*
+
         Once all of values are set, 'SIG_locality_values_updated' signal will
         be triggered to update FullTextSearch index for this Locality
         """
 
-        attrs = self._get_attr_map()
+        if spec_ids is None:
+            spec_ids = {
+                attr['attribute__key']: attr['id']
+                for attr in self._get_attr_map()
+            }
+        if values is None:
+            values = {
+                value.specification_id: value
+                for value in self.value_set.all()
+            }
+
+        changed_values = self.match_values(changed_data, spec_ids, values)
+
+        if changed_values:
+            tmp_changeset = Changeset.objects.create(social_user=social_user)
+            save_values(changed_values, tmp_changeset)
+
+        # send values_updated signal
+        signals.SIG_locality_values_updated.send(
+            sender=self.__class__, instance=self
+        )
+
+        return changed_values
+
+    def match_values(self, changed_data, spec_ids, values):
+        """
+        Match changed data with Specification ids (key: spec_id) and existing
+        Values (spec_id: value) of this Locality
 
-        tmp_changeset = None
+        Returns a list of changed, but unsaved, Values (obj, created)
+        """
 
         changed_values = []
         for key, data in changed_data.iteritems():
-            # try to match key from changed items with a key from attr_map
-            attr_list = [
-                attr for attr in attrs if attr['attribute__key'] == key
-            ]
-
-            if attr_list:
-                # get specification id for specific key
-                spec_id = attr_list[0]['id']
-
-                # update or create new values
-                try:
-                    obj = self.value_set.get(specification_id=spec_id)
-                    _created = False
-                except Value.DoesNotExist:
-                    # in case there is no value for the specification, create
-                    obj = Value()
-                    obj.locality = self
-                    obj.specification_id = spec_id
-                    _created = True
-
-                # set data
-                obj.data = data
-
-                # check if Value.data actually changed, and save if it did
-                if obj.tracker.changed():
-                    if not(tmp_changeset):
-                        tmp_changeset = Changeset.objects.create(
-                            social_user=social_user
-                        )
-                    obj.changeset = tmp_changeset
-                    obj.save()
-                    changed_values.append((obj, _created))
-                else:
-                    # nothing changed, don't save the value
-                    pass
-            else:
+            spec_id = spec_ids.get(key)
+
+            if spec_id is None:
                 # attr_id was not found (maybe a bad attribute)
                 LOG.warning(
                     'Locality %s has no attribute key %s', self.pk, key
                 )
+                continue
 
-        # send values_updated signal
-        signals.SIG_locality_values_updated.send(
-            sender=self.__class__, instance=self
-        )
+            obj = values.get(spec_id)
+            if obj is None:
+                # in case there is no value for the specification, create
+                obj = Value(locality=self, specification_id=spec_id)
+
+            # set data
+            obj.data = data
+
+            # check if Value.data actually changed, and save if it did
+            if obj.tracker.changed():
+                changed_values.append((obj, obj.pk is None))
 
         return changed_values
 
@@ -237,12 +255,14 @@ class Locality(UpdateMixin, ChangesetMixin):
         Basic locality representation, as a dictionary
         """
 
+        # retrieve attribute keys and data using a single query
+        values = self.value_set.values_list(
+            'specification__attribute__key', 'data'
+        )
+
         return {
             u'uuid': self.uuid,
-            u'values': {
-                val.specification.attribute.key: val.data
-                for val in self.value_set.select_related('attribute').all()
-            },
+            u'values': dict(values),
             u'geom': (self.geom.x, self.geom.y),
             u'version': self.version,
             u'changeset': self.changeset_id
@@ -315,6 +335,62 @@ class ValueArchive(ArchiveMixin):
     data = models.TextField(blank=True)
 
 
+def save_values(changed_values, changeset):
+    """
+    Save changed values (obj, created), of one or more Localities, and archive
+    them, as *save* would, without querying the database for every value
+    """
+
+    new_values = []
+    updated_values = []
+
+    for obj, created in changed_values:
+        obj.changeset = changeset
+        obj.inc_version()
+
+        if created:
+            new_values.append(obj)
+        else:
+            updated_values.append(obj)
+
+    if new_values:
+        Value.objects.bulk_create(new_values)
+
+        # bulk_create does not set primary keys of created objects
+        new_ids = {
+            (locality_id, specification_id): value_id
+            for locality_id, specification_id, value_id in (
+                Value.objects
+                .filter(
+                    locality_id__in={obj.locality_id for obj in new_values},
+                    specification_id__in={
+                        obj.specification_id for obj in new_values
+                    }
+                )
+                .values_list('locality_id', 'specification_id', 'id')
+            )
+        }
+        for obj in new_values:
+            obj.pk = new_ids[(obj.locality_id, obj.specification_id)]
+
+    if updated_values:
+        cursor = connection.cursor()
+        cursor.execute(
+            VALUES_UPDATE_SQL.format(
+                rows=', '.join(['(%s, %s, %s, %s)'] * len(updated_values))
+            ),
+            list(itertools.chain.from_iterable(
+                (obj.pk, obj.data, obj.version, changeset.pk)
+                for obj in updated_values
+            ))
+        )
+
+    signals.archive_values([obj for obj, _created in changed_values])
+
+    for obj, _created in changed_values:
+        obj.tracker.set_saved_fields()
+
+
 class Attribute(UpdateMixin, ChangesetMixin):
     """
     An Attribute is defined by a *key* and an optional *description*.
@@ -434,5 +510,35 @@ class LocalityIndex(models.Model):
         ('ranka', 'A'), ('rankb', 'B'), ('rankc', 'C'), ('rankd', 'D')
     ))
 
+
+class LocalityCluster(models.Model):
+    """
+    LocalityCluster is a precomputed cluster of Localities in a clustering
+    grid *cell* for a *zoom* level and an icon size (*pix_x*, *pix_y*)
+
+    Clusters are represented by the first Locality in a cell (*uuid* and
+    *geom*), *count* of Localities and their minimum bbox
+
+    LocalityClusters will be autoupdated when a Locality is changed
+    """
+
+    zoom = models.IntegerField()
+    pix_x = models.IntegerField()
+    pix_y = models.IntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    uuid = models.TextField()
+    count = models.IntegerField()
+    geom = models.PointField(srid=4326)
+    minbbox_minx = models.FloatField()
+    minbbox_miny = models.FloatField()
+    minbbox_maxx = models.FloatField()
+    minbbox_maxy = models.FloatField()
+
+    objects = models.GeoManager()
+
+    class Meta:
+        unique_together = ('zoom', 'pix_x', 'pix_y', 'cell_x', 'cell_y')
+
 # register signals
 import signals  # noqa
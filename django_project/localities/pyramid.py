@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.contrib.gis.geos import Point
+
+from .models import LocalityCluster
+from .map_clustering import cluster_cell_size, grid_cell, catchment_bbox
+
+
+# every cluster is represented by its first Locality
+PYRAMID_SQL = """
+    SELECT
+        floor(st_x(loc.geom) / %(cell_x)s)::integer,
+        floor(st_y(loc.geom) / %(cell_y)s)::integer,
+        (array_agg(loc.uuid ORDER BY loc.id))[1],
+        count(*),
+        (array_agg(st_x(loc.geom) ORDER BY loc.id))[1],
+        (array_agg(st_y(loc.geom) ORDER BY loc.id))[1],
+        min(st_x(loc.geom)), min(st_y(loc.geom)),
+        max(st_x(loc.geom)), max(st_y(loc.geom))
+    FROM localities_locality loc
+    WHERE {where}
+    GROUP BY 1, 2
+"""
+
+# bbox operator is used to take advantage of the spatial index
+CELL_WHERE_SQL = """
+    loc.geom && st_makeenvelope(
+        %(minx)s, %(miny)s, %(maxx)s, %(maxy)s, 4326
+    )
+    AND floor(st_x(loc.geom) / %(cell_x)s) = %(col)s
+    AND floor(st_y(loc.geom) / %(cell_y)s) = %(row)s
+"""
+
+# points of changed Localities, collected during *deferred_updates*
+_pending = threading.local()
+
+
+def pyramid_levels():
+    """
+    List every (zoom, pix_x, pix_y) level of the cluster pyramid
+    """
+
+    return [
+        (zoom, pix_x, pix_y)
+        for zoom in settings.CLUSTER_PYRAMID_ZOOMS
+        for pix_x, pix_y in settings.CLUSTER_PYRAMID_ICONSIZES
+    ]
+
+
+def in_pyramid(zoom, pix_x, pix_y):
+    """
+    Check if clusters for a zoom level and an icon size are precomputed
+    """
+
+    return bool(
+        settings.CLUSTER_PYRAMID and (zoom, pix_x, pix_y) in pyramid_levels()
+    )
+
+
+def _fetch_clusters(level, where, params):
+    """
+    Aggregate Localities, filtered by the *where* SQL, into LocalityClusters
+    for a pyramid level
+    """
+
+    zoom, pix_x, pix_y = level
+    cell_x, cell_y = cluster_cell_size(zoom, pix_x, pix_y)
+
+    params = dict(params, cell_x=cell_x, cell_y=cell_y)
+
+    cursor = connection.cursor()
+    cursor.execute(PYRAMID_SQL.format(where=where), params)
+
+    return [
+        LocalityCluster(
+            zoom=zoom, pix_x=pix_x, pix_y=pix_y, cell_x=row[0],
+            cell_y=row[1], uuid=row[2], count=row[3],
+            geom=Point(row[4], row[5], srid=4326),
+            minbbox_minx=row[6], minbbox_miny=row[7],
+            minbbox_maxx=row[8], minbbox_maxy=row[9]
+        )
+        for row in cursor.fetchall()
+    ]
+
+
+def build_level(zoom, pix_x, pix_y):
+    """
+    Recreate every LocalityCluster for a zoom level and an icon size
+    """
+
+    level = (zoom, pix_x, pix_y)
+
+    with transaction.atomic():
+        LocalityCluster.objects.filter(
+            zoom=zoom, pix_x=pix_x, pix_y=pix_y
+        ).delete()
+        LocalityCluster.objects.bulk_create(
+            _fetch_clusters(level, 'TRUE', {})
+        )
+
+
+def build_pyramid():
+    """
+    Recreate LocalityClusters for every pyramid level
+    """
+
+    for level in pyramid_levels():
+        LOG.info('Building cluster pyramid level: %s', level)
+        build_level(*level)
+
+
+def affected_cells(points):
+    """
+    Find pyramid cells (zoom, pix_x, pix_y, cell) of points (geomx, geomy) at
+    every pyramid level
+    """
+
+    cells = set()
+
+    for level in pyramid_levels():
+        cell_size = cluster_cell_size(*level)
+
+        for geomx, geomy in points:
+            cells.add(level + (grid_cell(geomx, geomy, cell_size),))
+
+    return cells
+
+
+def update_cells(cells):
+    """
+    Recreate LocalityClusters of pyramid cells (zoom, pix_x, pix_y, cell)
+    """
+
+    for zoom, pix_x, pix_y, (col, row) in cells:
+        cell_x, cell_y = cluster_cell_size(zoom, pix_x, pix_y)
+
+        # pad cell extent, exact cell membership is checked using floor
+        params = {
+            'col': col, 'row': row,
+            'minx': (col - 0.01) * cell_x, 'miny': (row - 0.01) * cell_y,
+            'maxx': (col + 1.01) * cell_x, 'maxy': (row + 1.01) * cell_y
+        }
+
+        with transaction.atomic():
+            LocalityCluster.objects.filter(
+                zoom=zoom, pix_x=pix_x, pix_y=pix_y, cell_x=col, cell_y=row
+            ).delete()
+            LocalityCluster.objects.bulk_create(
+                _fetch_clusters((zoom, pix_x, pix_y), CELL_WHERE_SQL, params)
+            )
+
+
+def update_localities(points):
+    """
+    Update pyramid cells affected by changed Localities at points
+    (geomx, geomy)
+
+    Within a *deferred_updates* block points are collected and cells are
+    updated at the end of the block
+    """
+
+    if not(settings.CLUSTER_PYRAMID):
+        return
+
+    pending = getattr(_pending, 'points', None)
+
+    if pending is None:
+        update_cells(affected_cells(points))
+    else:
+        pending.update(points)
+
+
+@contextmanager
+def deferred_updates():
+    """
+    Postpone pyramid updates until the end of the block, so every affected
+    cell is updated only once, which is useful for bulk changes like imports
+    """
+
+    if getattr(_pending, 'points', None) is not None:
+        # updates are already deferred by an outer block
+        yield
+        return
+
+    _pending.points = set()
+    try:
+        yield
+        points = _pending.points
+    finally:
+        _pending.points = None
+
+    update_localities(points)
+
+
+def pyramid_clusters(bbox, zoom, pix_x, pix_y):
+    """
+    Read precomputed clusters for a bbox, a zoom level and an icon size
+
+    Clusters of every cell which overlaps the bbox are returned, even if the
+    cluster point is just outside of the bbox, so clusters on the edges of a
+    map view don't disappear. Returned clusters have the same structure as
+    the *cluster* results
+    """
+
+    cell_size = cluster_cell_size(zoom, pix_x, pix_y)
+    min_x, min_y, max_x, max_y = bbox.extent
+    min_col, min_row = grid_cell(min_x, min_y, cell_size)
+    max_col, max_row = grid_cell(max_x, max_y, cell_size)
+
+    clusters = (
+        LocalityCluster.objects
+        .filter(
+            zoom=zoom, pix_x=pix_x, pix_y=pix_y,
+            cell_x__range=(min_col, max_col), cell_y__range=(min_row, max_row)
+        )
+        .extra(select={'geomx': 'st_x(geom)', 'geomy': 'st_y(geom)'})
+        .order_by('id')
+        .values_list(
+            'uuid', 'count', 'geomx', 'geomy', 'minbbox_minx',
+            'minbbox_miny', 'minbbox_maxx', 'minbbox_maxy'
+        )
+    )
+
+    return [{
+        'uuid': row[0],
+        'count': row[1],
+        'geom': (row[2], row[3]),
+        'bbox': catchment_bbox(row[2], row[3], zoom, pix_x, pix_y),
+        'minbbox': list(row[4:])
+    } for row in clusters]
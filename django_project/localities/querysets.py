@@ -2,11 +2,25 @@
 import logging
 LOG = logging.getLogger(__name__)
 
+import math
+
 from django.contrib.gis.db import models
+from django.contrib.gis.geos import Polygon
 from django.contrib.gis.db.models.query import GeoQuerySet
 
 from model_utils.managers import PassThroughManagerMixin
 
+# text search configuration of the LocalityIndex.fts_index
+FTS_DICTIONARY = 'english'
+
+# shortest length of a degree of latitude (meters), used to build bboxes
+# which surely contain a radius
+MIN_DEGREE_LENGTH = 110000.0
+
+# number of KNN candidates per requested nearest Locality, planar distance in
+# degrees overstates east-west distances away from the equator
+NEAREST_CANDIDATES = 10
+
 
 class PassThroughGeoManager(PassThroughManagerMixin, models.GeoManager):
     """
@@ -16,6 +30,33 @@ class PassThroughGeoManager(PassThroughManagerMixin, models.GeoManager):
     pass
 
 
+def radius_bbox(lng, lat, radius):
+    """
+    Create a bbox polygon which contains a radius (meters) around a point
+    """
+
+    delta_lat = radius / MIN_DEGREE_LENGTH
+    min_lat = max(lat - delta_lat, -90.0)
+    max_lat = min(lat + delta_lat, 90.0)
+
+    # a degree of longitude is the shortest at the latitude furthest from the
+    # equator
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+
+    if cos_lat * 180.0 * MIN_DEGREE_LENGTH <= radius:
+        # radius contains a pole or covers every longitude
+        min_lng, max_lng = -180.0, 180.0
+    else:
+        delta_lng = delta_lat / cos_lat
+        min_lng, max_lng = lng - delta_lng, lng + delta_lng
+
+        if min_lng < -180.0 or max_lng > 180.0:
+            # radius crosses the antimeridian
+            min_lng, max_lng = -180.0, 180.0
+
+    return Polygon.from_bbox((min_lng, min_lat, max_lng, max_lat))
+
+
 class LocalitiesQuerySet(GeoQuerySet):
     def in_bbox(self, bbox):
         """
@@ -25,6 +66,37 @@ class LocalitiesQuerySet(GeoQuerySet):
         LOG.debug('Filtering Localities using bbox: %s', bbox.wkt)
         return self.filter(geom__contained=bbox)
 
+    def within_polygon(self, polygon):
+        """
+        Filter Localities within a polygon
+        """
+
+        LOG.debug('Filtering Localities using polygon: %s', polygon.wkt)
+        return self.filter(geom__within=polygon)
+
+    def within_radius(self, lng, lat, radius):
+        """
+        Filter Localities within a radius (meters) of a point
+
+        Geographic distance can't use the spatial index, so Localities are
+        first filtered by a bbox which contains the radius
+        """
+
+        LOG.debug(
+            'Filtering Localities using radius: %s around %s, %s',
+            radius, lng, lat
+        )
+
+        return self.filter(
+            geom__bboverlaps=radius_bbox(lng, lat, radius)
+        ).extra(
+            where=[
+                'st_dwithin(localities_locality.geom::geography, '
+                'st_setsrid(st_makepoint(%s, %s), 4326)::geography, %s)'
+            ],
+            params=(lng, lat, radius)
+        )
+
     def get_lnglat(self):
         """
         Use database to extract geometry
@@ -33,3 +105,104 @@ class LocalitiesQuerySet(GeoQuerySet):
         """
 
         return self.extra(select={'lnglat': 'st_x(geom)||$$,$$||st_y(geom)'})
+
+    def search(self, query):
+        """
+        Filter Localities which LocalityIndex matches a text query, Localities
+        are ranked using weights of ranked Values
+        """
+
+        LOG.debug('Searching Localities using query: %s', query)
+
+        tsquery = 'plainto_tsquery(%s, %s)'
+
+        return self.filter(localityindex__isnull=False).extra(
+            select={
+                'rank': 'ts_rank(localities_localityindex.fts_index, {})'
+                .format(tsquery)
+            },
+            select_params=(FTS_DICTIONARY, query),
+            where=[
+                'localities_localityindex.fts_index @@ {}'.format(tsquery)
+            ],
+            params=(FTS_DICTIONARY, query)
+        )
+
+    def autocomplete(self, prefix):
+        """
+        Filter Localities which name (rank A text of the LocalityIndex) starts
+        with a prefix, ignoring the case
+
+        Filter is using the *lower(ranka) COLLATE "C"* index, see
+        *order_by_name*
+        """
+
+        # escape LIKE wildcards
+        prefix = (
+            prefix.replace('\\', '\\\\').replace('%', '\\%')
+            .replace('_', '\\_')
+        )
+
+        return self.filter(localityindex__isnull=False).extra(
+            select={'name': 'localities_localityindex.ranka'},
+            where=[
+                'lower(localities_localityindex.ranka) COLLATE "C" LIKE %s'
+            ],
+            params=(prefix.lower() + '%',)
+        )
+
+    def order_by_name(self):
+        """
+        Order Localities by the *name_key* (lower case rank A text of the
+        LocalityIndex) and id, matching the *lower(ranka) COLLATE "C",
+        locality_id* index, so only a limited number of index entries is read
+        instead of sorting every match
+        """
+
+        return self.filter(localityindex__isnull=False).extra(
+            select={
+                'name_key': 'lower(localities_localityindex.ranka) COLLATE "C"'
+            }
+        ).order_by('name_key', 'id')
+
+    def order_by_distance(self, lng, lat):
+        """
+        Order Localities by distance from a point, using KNN ordering of the
+        spatial index
+        """
+
+        return self.extra(
+            select={
+                'knn_distance': (
+                    'localities_locality.geom <-> '
+                    'st_setsrid(st_makepoint(%s, %s), 4326)'
+                )
+            },
+            select_params=(lng, lat)
+        ).order_by('knn_distance')
+
+    def nearest(self, lng, lat, num):
+        """
+        Order candidates for *num* Localities nearest to a point by geographic
+        *distance* (meters)
+
+        KNN ordering of the spatial index is planar (degrees), so it only
+        picks NEAREST_CANDIDATES times *num* candidates which are then
+        ordered by geographic distance
+        """
+
+        candidates = self.order_by_distance(lng, lat).values_list(
+            'id', 'knn_distance'
+        )[:num * NEAREST_CANDIDATES]
+
+        return self.filter(
+            id__in=[loc_id for loc_id, _ in candidates]
+        ).extra(
+            select={
+                'distance': (
+                    'st_distance(localities_locality.geom::geography, '
+                    'st_setsrid(st_makepoint(%s, %s), 4326)::geography)'
+                )
+            },
+            select_params=(lng, lat)
+        ).order_by('distance', 'id')
@@ -2,8 +2,9 @@
 import logging
 LOG = logging.getLogger(__name__)
 
+from django.conf import settings
 from django.dispatch import receiver, Signal
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.contrib.contenttypes.models import ContentType
 
 
@@ -20,6 +21,11 @@ from .models import (
     Value,
     ValueArchive
 )
+from .pyramid import update_localities
+from .tiles import invalidate_tiles
+from .utils import invalidate_domain_fragment
+from .archives import save_archive, save_archives
+from .indexing import update_locality_index
 
 # define custom signals
 SIG_locality_values_updated = Signal()
@@ -29,13 +35,16 @@ def archive_basic_info(archive, instance, content_type):
     """
     Helper function that handles archival of basic object information, like
     *content_type*, *object_id*, *version* and *changeset*
+
+    ContentTypes should be retrieved using *get_for_model*, which caches them
+    for the lifetime of the process
     """
 
     archive.content_type = content_type
     archive.object_id = instance.pk
 
     archive.version = instance.version
-    archive.changeset = instance.changeset
+    archive.changeset_id = instance.changeset_id
 
 
 @receiver(post_save, sender=Domain)
@@ -44,7 +53,7 @@ def domain_archive_handler(sender, instance, created, raw, **kwargs):
     *post_save* triggered change archival for a Domain object
     """
 
-    ct = ContentType.objects.get(app_label='localities', model='domain')
+    ct = ContentType.objects.get_for_model(Domain)
     archive = DomainArchive()
 
     archive_basic_info(archive, instance, ct)
@@ -53,7 +62,16 @@ def domain_archive_handler(sender, instance, created, raw, **kwargs):
     archive.description = instance.description
     archive.template_fragment = instance.template_fragment
 
-    archive.save()
+    save_archive(archive)
+
+
+@receiver(post_save, sender=Domain)
+def domain_fragment_handler(sender, instance, created, raw, **kwargs):
+    """
+    *post_save* triggered compiled template fragment removal for a Domain
+    """
+
+    invalidate_domain_fragment(instance.pk)
 
 
 @receiver(post_save, sender=Attribute)
@@ -62,7 +80,7 @@ def attribute_archive_handler(sender, instance, created, raw, **kwargs):
     *post_save* triggered change archival for an Attribute object
     """
 
-    ct = ContentType.objects.get(app_label='localities', model='attribute')
+    ct = ContentType.objects.get_for_model(Attribute)
     archive = AttributeArchive()
 
     archive_basic_info(archive, instance, ct)
@@ -70,7 +88,7 @@ def attribute_archive_handler(sender, instance, created, raw, **kwargs):
     archive.key = instance.key
     archive.description = instance.description
 
-    archive.save()
+    save_archive(archive)
 
 
 @receiver(post_save, sender=Specification)
@@ -79,53 +97,159 @@ def specification_archive_handler(sender, instance, created, raw, **kwargs):
     *post_save* triggered change archival for a Specification object
     """
 
-    ct = ContentType.objects.get(app_label='localities', model='specification')
+    ct = ContentType.objects.get_for_model(Specification)
     archive = SpecificationArchive()
 
     archive_basic_info(archive, instance, ct)
 
-    archive.domain_id = instance.domain.pk
-    archive.attribute_id = instance.attribute.pk
+    archive.domain_id = instance.domain_id
+    archive.attribute_id = instance.attribute_id
     archive.required = instance.required
 
-    archive.save()
+    save_archive(archive)
 
 
-@receiver(post_save, sender=Locality)
-def locality_archive_handler(sender, instance, created, raw, **kwargs):
+def locality_archive(instance, content_type):
     """
-    *post_save* triggered change archival for a Locality object
+    Helper function that creates an unsaved LocalityArchive for a Locality
+    object
     """
 
-    ct = ContentType.objects.get(app_label='localities', model='locality')
     archive = LocalityArchive()
 
-    archive_basic_info(archive, instance, ct)
+    archive_basic_info(archive, instance, content_type)
 
-    archive.domain_id = instance.domain.pk
+    archive.domain_id = instance.domain_id
     archive.uuid = instance.uuid
     archive.upstream_id = instance.upstream_id
     archive.geom = instance.geom
 
-    archive.save()
+    return archive
 
 
-@receiver(post_save, sender=Value)
-def value_archive_handler(sender, instance, created, raw, **kwargs):
+def archive_localities(localities):
     """
-    *post_save* triggered change archival for a Value object
+    Archive a list of Locality objects, which were saved without triggering
+    *post_save*, using a single query
+    """
+
+    ct = ContentType.objects.get_for_model(Locality)
+
+    save_archives(
+        [locality_archive(locality, ct) for locality in localities]
+    )
+
+
+@receiver(post_save, sender=Locality)
+def locality_archive_handler(sender, instance, created, raw, **kwargs):
+    """
+    *post_save* triggered change archival for a Locality object
+    """
+
+    ct = ContentType.objects.get_for_model(Locality)
+
+    save_archive(locality_archive(instance, ct))
+
+
+def moved_points(instance, created):
+    """
+    Helper function that lists current and previous points (geomx, geomy) of
+    a created or moved Locality
+    """
+
+    if not(created) and not(instance.tracker.has_changed('geom')):
+        # Locality has not been moved
+        return []
+
+    points = [(instance.geom.x, instance.geom.y)]
+
+    previous_geom = instance.tracker.previous('geom')
+    if previous_geom:
+        points.append((previous_geom.x, previous_geom.y))
+
+    return points
+
+
+@receiver(post_save, sender=Locality)
+def locality_cluster_handler(sender, instance, created, raw, **kwargs):
+    """
+    *post_save* triggered LocalityCluster update for a Locality
+    """
+
+    points = moved_points(instance, created)
+
+    if points:
+        update_localities(points)
+
+
+@receiver(post_delete, sender=Locality)
+def locality_delete_cluster_handler(sender, instance, **kwargs):
+    """
+    *post_delete* triggered LocalityCluster update for a Locality
+    """
+
+    update_localities([(instance.geom.x, instance.geom.y)])
+
+
+@receiver(post_save, sender=Locality)
+def locality_tile_cache_handler(sender, instance, created, raw, **kwargs):
+    """
+    *post_save* triggered clustered tiles invalidation for a Locality
+    """
+
+    points = moved_points(instance, created)
+
+    if points:
+        invalidate_tiles(points)
+
+
+@receiver(post_delete, sender=Locality)
+def locality_delete_tile_cache_handler(sender, instance, **kwargs):
+    """
+    *post_delete* triggered clustered tiles invalidation for a Locality
+    """
+
+    invalidate_tiles([(instance.geom.x, instance.geom.y)])
+
+
+def value_archive(instance, content_type):
+    """
+    Helper function that creates an unsaved ValueArchive for a Value object
     """
 
-    ct = ContentType.objects.get(app_label='localities', model='value')
     archive = ValueArchive()
 
-    archive_basic_info(archive, instance, ct)
+    archive_basic_info(archive, instance, content_type)
 
-    archive.locality_id = instance.locality.pk
-    archive.specification_id = instance.specification.pk
+    archive.locality_id = instance.locality_id
+    archive.specification_id = instance.specification_id
     archive.data = instance.data
 
-    archive.save()
+    return archive
+
+
+def archive_values(values):
+    """
+    Archive a list of Value objects, which were saved without triggering
+    *post_save*, using a single query
+    """
+
+    ct = ContentType.objects.get_for_model(Value)
+
+    save_archives(
+        [value_archive(value, ct) for value in values]
+    )
+
+
+@receiver(post_save, sender=Value)
+def value_archive_handler(sender, instance, created, raw, **kwargs):
+    """
+    *post_save* triggered change archival for a Value object
+    """
+
+    ct = ContentType.objects.get_for_model(Value)
+
+    save_archive(value_archive(instance, ct))
 
 
 @receiver(SIG_locality_values_updated, sender=Locality)
@@ -136,6 +260,11 @@ def values_updated_handler(sender, instance, **kwargs):
 
     LOG.debug('Updating LocalityIndex for Locality: %s', instance.pk)
 
+    if settings.LOCALITY_INDEX_SQL:
+        # aggregate ranked values in the database
+        update_locality_index([instance.pk])
+        return
+
     # retrieve ranked attribute values for a Locality
     loc_fts = instance.prepare_for_fts()
 
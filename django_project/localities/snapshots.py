@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Domain, Locality, Value
+from .exceptions import LocalityExportError
+from .exporters import EXPORTERS, domain_keys, export_localities
+
+MANIFEST_NAME = 'manifest.json'
+
+EXTENSIONS = {
+    'geojsonseq': 'geojsons',
+    'csv': 'csv',
+    'gpkg': 'gpkg'
+}
+
+
+def snapshot_root():
+    """
+    Directory of dataset snapshots, within the MEDIA_ROOT
+    """
+
+    return os.path.join(settings.MEDIA_ROOT, settings.SNAPSHOT_DIR)
+
+
+def load_manifest(root):
+    """
+    Load snapshot manifest, an empty manifest if snapshots were never built
+    """
+
+    try:
+        with open(os.path.join(root, MANIFEST_NAME)) as manifest_file:
+            return json.load(manifest_file)
+    except IOError:
+        return {'domains': {}}
+
+
+def _save_manifest(root, manifest):
+    # the manifest is replaced atomically, readers never see a partial file
+    handle, tmp_name = tempfile.mkstemp(dir=root, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+
+    os.chmod(tmp_name, 0o644)
+    os.rename(tmp_name, os.path.join(root, MANIFEST_NAME))
+
+
+def domain_state(domain):
+    """
+    Describe the state of a Domain dataset, the latest Changeset id of a
+    Domain, its Specifications, Localities and Values and numbers of its
+    Localities and Values
+
+    Deletes do not create Changesets, but they change the counts
+    """
+
+    localities = Locality.objects.filter(domain=domain).aggregate(
+        id=Max('changeset'), count=Count('id')
+    )
+    values = Value.objects.filter(locality__domain=domain).aggregate(
+        id=Max('changeset'), count=Count('id')
+    )
+
+    return {
+        'changeset': max([
+            domain.changeset_id,
+            domain.specification_set.aggregate(id=Max('changeset'))['id'],
+            localities['id'],
+            values['id']
+        ]),
+        'localities': localities['count'],
+        'values': values['count']
+    }
+
+
+def _file_sha256(filename, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+
+    with open(filename, 'rb') as snapshot_file:
+        for chunk in iter(lambda: snapshot_file.read(chunk_size), ''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def _export(domain, fmt, keys, tmp_dir):
+    """
+    Export Localities of a Domain to a gzip compressed file, returns filename
+    and number of exported Localities
+    """
+
+    gz_name = os.path.join(tmp_dir, 'snapshot.gz')
+
+    # empty name and mtime in the gzip header, so identical datasets have
+    # identical content hashes
+    with open(gz_name, 'wb') as raw_file:
+        output = gzip.GzipFile(
+            filename='', mode='wb', fileobj=raw_file, mtime=0
+        )
+        try:
+            if fmt == 'gpkg':
+                # GeoPackage is written by GDAL, and compressed afterwards
+                gpkg_name = os.path.join(tmp_dir, 'snapshot.gpkg')
+                count = export_localities(
+                    domain, EXPORTERS[fmt](gpkg_name, keys)
+                )
+                with open(gpkg_name, 'rb') as gpkg_file:
+                    shutil.copyfileobj(gpkg_file, output)
+            else:
+                count = export_localities(domain, EXPORTERS[fmt](output, keys))
+        finally:
+            output.close()
+
+    return gz_name, count
+
+
+def write_snapshot(domain, fmt, root):
+    """
+    Write a compressed snapshot of a Domain in a format
+
+    Snapshot filename contains the content hash, so a file is never changed
+    once written and can be cached indefinitely, returns a manifest entry
+    """
+
+    tmp_dir = tempfile.mkdtemp(dir=root)
+
+    try:
+        tmp_name, count = _export(domain, fmt, domain_keys(domain), tmp_dir)
+
+        sha256 = _file_sha256(tmp_name)
+        filename = '{}-{}.{}.gz'.format(
+            slugify(domain.name), sha256[:16], EXTENSIONS[fmt]
+        )
+
+        os.chmod(tmp_name, 0o644)
+        os.rename(tmp_name, os.path.join(root, filename))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+    return {
+        'filename': filename,
+        'sha256': sha256,
+        'size': os.path.getsize(os.path.join(root, filename)),
+        'count': count
+    }
+
+
+def _write_snapshots(domain, formats, root):
+    snapshots = {}
+    failed = []
+
+    for fmt in formats:
+        try:
+            snapshots[fmt] = write_snapshot(domain, fmt, root)
+        except LocalityExportError as e:
+            LOG.error(
+                'Can not build %s snapshot of %s: %s', fmt, domain.name, e
+            )
+            failed.append(fmt)
+
+    return snapshots, failed
+
+
+def _remove_snapshots(root, entry, current_files):
+    for snapshot in entry.get('formats', {}).values():
+        if snapshot['filename'] in current_files:
+            continue
+        try:
+            os.remove(os.path.join(root, snapshot['filename']))
+        except OSError:
+            LOG.warning('Can not remove snapshot %s', snapshot['filename'])
+
+
+def build_snapshots(force=False):
+    """
+    Build snapshots of every Domain in every SNAPSHOT_FORMATS format
+
+    A Domain is exported only if its state (see *domain_state*) has changed
+    since the previous build, or *force* is set. Snapshots replaced by new
+    ones are removed after the manifest is updated. Formats which fail to
+    export are logged, recorded in the manifest and retried once the Domain
+    state changes
+
+    Returns names of exported Domains
+    """
+
+    root = snapshot_root()
+    if not os.path.isdir(root):
+        os.makedirs(root)
+
+    manifest = load_manifest(root)
+    formats = sorted(settings.SNAPSHOT_FORMATS)
+
+    old_entries = manifest['domains']
+    new_entries = {}
+    exported = []
+
+    for domain in Domain.objects.order_by('name'):
+        state = domain_state(domain)
+        entry = old_entries.get(domain.name)
+
+        if (not(force) and entry and entry.get('state') == state and
+                sorted(entry['formats'].keys() + entry.get('failed', [])) ==
+                formats):
+            LOG.debug('Snapshots of %s are up to date', domain.name)
+            new_entries[domain.name] = entry
+            continue
+
+        LOG.info('Building snapshots of %s', domain.name)
+        snapshots, failed = _write_snapshots(domain, formats, root)
+        new_entries[domain.name] = {
+            'state': state,
+            'generated': timezone.now().isoformat(),
+            'formats': snapshots,
+            'failed': failed
+        }
+        exported.append(domain.name)
+
+    manifest['domains'] = new_entries
+    _save_manifest(root, manifest)
+
+    current_files = set(
+        snapshot['filename']
+        for entry in new_entries.values()
+        for snapshot in entry['formats'].values()
+    )
+    for entry in old_entries.values():
+        _remove_snapshots(root, entry, current_files)
+
+    return exported
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
+
+from .model_factories import LocalityF, ValueF
+
+from ..models import Locality, LocalityArchive, Value, ValueArchive
+from ..archives import deferred_archives, save_archive
+from ..signals import locality_archive, value_archive
+
+
+class TestArchives(TestCase):
+    def setUp(self):
+        self.localities = [LocalityF.create(), LocalityF.create()]
+        self.values = [ValueF.create(), ValueF.create(), ValueF.create()]
+
+        self.locality_archives = LocalityArchive.objects.count()
+        self.value_archives = ValueArchive.objects.count()
+
+    def test_deferred_archives(self):
+        with deferred_archives():
+            for locality in self.localities:
+                locality.geom = 'POINT (1 1)'
+                locality.save()
+
+            for value in self.values:
+                value.data = 'new value'
+                value.save()
+
+            # nothing is archived until the end of the block
+            self.assertEqual(
+                LocalityArchive.objects.count(), self.locality_archives
+            )
+            self.assertEqual(ValueArchive.objects.count(), self.value_archives)
+
+        self.assertEqual(
+            LocalityArchive.objects.count(), self.locality_archives + 2
+        )
+        self.assertEqual(
+            ValueArchive.objects.count(), self.value_archives + 3
+        )
+
+    def test_deferred_archives_num_queries(self):
+        ct_locality = ContentType.objects.get_for_model(Locality)
+        ct_value = ContentType.objects.get_for_model(Value)
+
+        def defer_archives():
+            with deferred_archives():
+                for locality in self.localities:
+                    save_archive(locality_archive(locality, ct_locality))
+                for value in self.values:
+                    save_archive(value_archive(value, ct_value))
+
+        # a single query for every archive model
+        self.assertNumQueries(2, defer_archives)
+
+    def test_deferred_archives_exception(self):
+        def fail():
+            with deferred_archives():
+                for value in self.values:
+                    value.data = 'new value'
+                    value.save()
+
+                raise ValueError
+
+        self.assertRaises(ValueError, fail)
+
+        # archives are not saved
+        self.assertEqual(ValueArchive.objects.count(), self.value_archives)
+
+    def test_deferred_archives_savepoint_rollback(self):
+        with transaction.atomic(), deferred_archives():
+            locality = self.localities[0]
+            locality.geom = 'POINT (1 1)'
+            locality.save()
+
+            try:
+                with transaction.atomic():
+                    for value in self.values:
+                        value.data = 'new value'
+                        value.save()
+
+                    raise ValueError
+            except ValueError:
+                pass
+
+        # archives of rolled back changes are not saved
+        self.assertEqual(
+            LocalityArchive.objects.count(), self.locality_archives + 1
+        )
+        self.assertEqual(ValueArchive.objects.count(), self.value_archives)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.core.cache import cache
+
+from .model_factories import ChangesetF, LocalityF, ValueF
+
+from ..caching import detail_cache_key, cached_detail
+
+
+class TestCaching(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_cache_key(self):
+        locality = LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659162')
+
+        self.assertEqual(
+            detail_cache_key('api', locality),
+            'localities:detail:api:93b7e8c4621a4597938dfd3d27659162:1:None:0:1'
+        )
+
+        value = ValueF.create(locality=locality)
+
+        self.assertEqual(
+            detail_cache_key('api', locality),
+            'localities:detail:api:93b7e8c4621a4597938dfd3d27659162:1:{}:1:1'
+            .format(value.changeset_id)
+        )
+
+    def test_cached_detail(self):
+        locality = LocalityF.create()
+
+        payload, etag = cached_detail('api', locality, lambda: {'a': 1})
+
+        self.assertEqual(payload, {'a': 1})
+
+        # cached payload is returned, build function is not called
+        self.assertEqual(
+            cached_detail('api', locality, lambda: {'a': 2}), (payload, etag)
+        )
+
+        # a changed Value results in a new cache key
+        ValueF.create(locality=locality, changeset=ChangesetF.create())
+
+        new_payload, new_etag = cached_detail(
+            'api', locality, lambda: {'a': 2}
+        )
+
+        self.assertEqual(new_payload, {'a': 2})
+        self.assertNotEqual(new_etag, etag)
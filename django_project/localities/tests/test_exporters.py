@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import json
+from StringIO import StringIO
+
+from django.test import TestCase
+
+from .model_factories import (
+    DomainF,
+    AttributeF,
+    SpecificationF,
+    LocalityF,
+    ValueF
+)
+
+from ..exporters import (
+    RECORD_SEPARATOR,
+    CSVExporter,
+    GeoJSONSeqExporter,
+    domain_keys,
+    domain_localities,
+    export_localities
+)
+from .._csv_unicode import UnicodeDictReader
+
+
+class TestExporters(TestCase):
+    def setUp(self):
+        self.domain = DomainF.create(name='Test')
+
+        spec1 = SpecificationF.create(
+            domain=self.domain, attribute=AttributeF.create(key='name')
+        )
+        SpecificationF.create(
+            domain=self.domain, attribute=AttributeF.create(key='url')
+        )
+
+        self.loc1 = LocalityF.create(
+            domain=self.domain, uuid='uuid_1', geom='POINT (16 45)'
+        )
+        ValueF.create(
+            locality=self.loc1, specification=spec1, data=u'Zagreb Clinic'
+        )
+        self.loc2 = LocalityF.create(
+            domain=self.domain, uuid='uuid_2', geom='POINT (-1 -2)'
+        )
+
+        # Localities of other Domains are not exported
+        LocalityF.create()
+
+    def test_domain_keys(self):
+        self.assertListEqual(domain_keys(self.domain), ['name', 'url'])
+
+    def test_domain_localities(self):
+        features = list(domain_localities(self.domain, chunk_size=1))
+
+        self.assertEqual(len(features), 2)
+
+        self.assertEqual(features[0]['uuid'], 'uuid_1')
+        self.assertEqual(features[0]['geom'], (16.0, 45.0))
+        self.assertDictEqual(
+            features[0]['values'], {'name': u'Zagreb Clinic'}
+        )
+
+        # Localities without Values are exported
+        self.assertEqual(features[1]['uuid'], 'uuid_2')
+        self.assertDictEqual(features[1]['values'], {})
+
+    def test_export_geojsonseq(self):
+        output = StringIO()
+
+        count = export_localities(
+            self.domain,
+            GeoJSONSeqExporter(output, domain_keys(self.domain))
+        )
+
+        self.assertEqual(count, 2)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith(RECORD_SEPARATOR))
+
+        feature = json.loads(lines[0][1:])
+        self.assertDictEqual(
+            feature['geometry'], {'type': 'Point', 'coordinates': [16, 45]}
+        )
+        self.assertEqual(feature['properties']['uuid'], 'uuid_1')
+        self.assertEqual(feature['properties']['name'], u'Zagreb Clinic')
+        self.assertIsNone(feature['properties']['url'])
+
+    def test_export_csv(self):
+        output = StringIO()
+
+        count = export_localities(
+            self.domain, CSVExporter(output, domain_keys(self.domain))
+        )
+
+        self.assertEqual(count, 2)
+
+        output.seek(0)
+        rows = list(UnicodeDictReader(output))
+
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['uuid'], 'uuid_1')
+        self.assertEqual(rows[0]['name'], u'Zagreb Clinic')
+        self.assertEqual(rows[0]['url'], u'')
+        self.assertEqual(float(rows[1]['lng']), -1.0)
+        self.assertEqual(float(rows[1]['lat']), -2.0)
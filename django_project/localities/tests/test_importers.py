@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+from django.db import transaction
 from django.test import TestCase
 
 from .model_factories import (
@@ -9,8 +10,9 @@ from .model_factories import (
 )
 
 from ..importers import CSVImporter
-from ..models import Locality, Value
+from ..models import Locality, Value, LocalityArchive, LocalityIndex
 from ..exceptions import LocalityImportError
+from .._csv_unicode import UnicodeDictReader
 
 
 class TestImporters(TestCase):
@@ -140,3 +142,293 @@ class TestImporters(TestCase):
                 u'HIV Treatment; HIV Counseling; HIV Testing',
                 u'Andrieskraal Satellite Clinic'
             ])
+
+    def test_ok_data_bulk(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            bulk=True
+        )
+
+        self.assertEqual(Locality.objects.count(), 3)
+        self.assertEqual(Value.objects.count(), 8)
+
+        self.assertEqual(LocalityArchive.objects.count(), 3)
+        self.assertEqual(LocalityIndex.objects.count(), 3)
+        locind = LocalityIndex.objects.get(locality__upstream_id=u'test_imp¶2')
+        self.assertIn(u'Athalia Satellite Clinic', u' '.join([
+            locind.ranka, locind.rankb, locind.rankc, locind.rankd
+        ]))
+
+    def test_find_by_upstream_id_bulk(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='services')
+
+        dom = DomainSpecification2AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2
+        )
+
+        loc = LocalityF.create(
+            upstream_id='test_imp¶2', domain=dom,
+            geom='POINT (30.9227 -26.9877)'
+        )
+
+        CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_bad.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            bulk=True
+        )
+
+        self.assertEqual(Locality.objects.count(), 2)
+        self.assertEqual(Value.objects.count(), 4)
+
+        # geometry did not change, Locality was not updated
+        self.assertEqual(Locality.objects.get(pk=loc.pk).version, 1)
+
+        self.assertEqual(
+            sorted(loc.value_set.values_list('data', flat=True)), [
+                u'Athalia Satellite Clinic',
+                u'HIV Treatment; HIV Counseling; HIV Testing'
+            ])
+
+    def test_ok_data_chunks(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        for bulk in (False, True):
+            importer = CSVImporter(
+                'Test', 'test_imp',
+                './localities/tests/test_data/test_csv_import_ok.csv',
+                './localities/tests/test_data/test_csv_import_map.json',
+                bulk=bulk, chunk_size=2
+            )
+
+            # duplicated row is skipped
+            self.assertEqual(len(importer.upstream_ids), 3)
+
+            self.assertEqual(Locality.objects.count(), 3)
+            self.assertEqual(Value.objects.count(), 8)
+
+    def test_parse_chunks(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        importer = CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_bad.csv',
+            './localities/tests/test_data/test_csv_import_map.json'
+        )
+
+        # parse the file again, in chunks of a single row
+        importer.upstream_ids = set()
+        importer.chunk_size = 1
+
+        with open(importer.csv_filename, 'rb') as csv_file:
+            chunks = list(importer.parse_chunks(UnicodeDictReader(csv_file)))
+
+        self.assertEqual(
+            [[row['upstream_id'] for row in chunk] for chunk in chunks],
+            [[u'test_imp¶1'], [u'test_imp¶2']]
+        )
+
+    def test_ok_data_throughput(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        importer = CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            chunk_size=1
+        )
+
+        self.assertEqual(importer.row_count, 3)
+        self.assertTrue(importer.throughput() > 0)
+
+        self.assertEqual(Locality.objects.count(), 3)
+        self.assertEqual(Value.objects.count(), 8)
+
+    def _import_result(self, csv_filename, **kwargs):
+        importer = CSVImporter(
+            'Test', 'test_imp', csv_filename,
+            './localities/tests/test_data/test_csv_import_map.json',
+            **kwargs
+        )
+
+        return importer.row_count, importer.stats, sorted(
+            (
+                loc.upstream_id, loc.geom.coords,
+                sorted(loc.repr_dict()['values'].items())
+            )
+            for loc in Locality.objects.all()
+        )
+
+    def test_ok_data_workers(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        for csv_filename in (
+                './localities/tests/test_data/test_csv_import_ok.csv',
+                './localities/tests/test_data/test_csv_import_bad.csv'):
+            for bulk in (False, True):
+                sid = transaction.savepoint()
+                serial = self._import_result(
+                    csv_filename, bulk=bulk, chunk_size=1
+                )
+                transaction.savepoint_rollback(sid)
+
+                # duplicated, invalid and valid rows are handled the same way
+                self.assertEqual(
+                    self._import_result(
+                        csv_filename, bulk=bulk, chunk_size=1, workers=2
+                    ), serial
+                )
+                transaction.savepoint_rollback(sid)
+
+    def test_ok_data_workers_failed(self):
+        DomainSpecification3AF.create(name='Test')
+
+        # every worker fails to open the file
+        self.assertRaises(
+            LocalityImportError, CSVImporter, 'Test', 'test_imp',
+            './localities/tests/test_data/missing.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            workers=2
+        )
+
+    def test_diff_rows(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        importer = CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            dry_run=True
+        )
+
+        # nothing was saved
+        self.assertEqual(importer.stats, {
+            'created': 3, 'updated': 0, 'unchanged': 0, 'geom_unchanged': 0
+        })
+        self.assertEqual(Locality.objects.count(), 0)
+
+        CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json'
+        )
+
+        Value.objects.filter(data=u'Amsterdam CHC').update(data=u'Amsterdam')
+        archive_count = LocalityArchive.objects.count()
+
+        importer = CSVImporter(
+            'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.tsv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            use_tabs=True
+        )
+
+        # only the changed row is saved
+        self.assertEqual(importer.stats, {
+            'created': 0, 'updated': 1, 'unchanged': 2, 'geom_unchanged': 1
+        })
+        # Locality was not saved, as only a value was changed
+        self.assertEqual(LocalityArchive.objects.count(), archive_count)
+        self.assertEqual(
+            Value.objects.filter(data=u'Amsterdam CHC').count(), 1
+        )
+
+        # changed rows carry matched Localities and their loaded Values
+        Value.objects.filter(data=u'Amsterdam CHC').update(data=u'Amsterdam')
+
+        with open(importer.csv_filename, 'rb') as csv_file:
+            importer.upstream_ids = set()
+            chunk = next(importer.parse_chunks(
+                UnicodeDictReader(csv_file, delimiter='\t')
+            ))
+
+        changed_rows = importer.diff_rows(chunk)
+        self.assertEqual(len(changed_rows), 1)
+
+        row, loc, values = changed_rows[0]
+        self.assertEqual(loc.upstream_id, row['upstream_id'])
+        self.assertEqual(
+            sorted(value.data for value in values.values()),
+            sorted(Value.objects.filter(locality=loc).values_list(
+                'data', flat=True
+            ))
+        )
+
+    def test_geom_tolerance(self):
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='services')
+
+        dom = DomainSpecification2AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2
+        )
+
+        # coordinates differ less than the tolerance
+        loc = LocalityF.create(
+            upstream_id='test_imp¶2', domain=dom,
+            geom='POINT (30.92270001 -26.98770001)'
+        )
+
+        for bulk in (False, True):
+            importer = CSVImporter(
+                'Test', 'test_imp',
+                './localities/tests/test_data/test_csv_import_bad.csv',
+                './localities/tests/test_data/test_csv_import_map.json',
+                bulk=bulk
+            )
+
+            # only the initial version of the Locality is archived
+            self.assertEqual(Locality.objects.get(pk=loc.pk).version, 1)
+            self.assertEqual(
+                LocalityArchive.objects.filter(object_id=loc.pk).count(), 1
+            )
+
+        # values were added by the first import, nothing changed afterwards
+        self.assertEqual(importer.stats['geom_unchanged'], 0)
+        self.assertEqual(importer.stats['unchanged'], 2)
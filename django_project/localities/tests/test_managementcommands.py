@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
 from django.test import TestCase
 from django.core.management import call_command
 from django.core.management.base import CommandError
+from django.test.utils import override_settings
 
-from .model_factories import AttributeF, DomainSpecification3AF
+from .model_factories import (
+    AttributeF, DomainF, DomainSpecification3AF, LocalityF
+)
 
-from ..models import Locality, Value
+from ..models import Locality, Value, LocalityCluster
 
 
 class TestManagementCommands(TestCase):
@@ -30,8 +38,121 @@ class TestManagementCommands(TestCase):
         self.assertEqual(Locality.objects.count(), 3)
         self.assertEqual(Value.objects.count(), 8)
 
+    def test_import_csv_throughput(self):
+
+        attr1 = AttributeF.create(key='name')
+        attr2 = AttributeF.create(key='url')
+        attr3 = AttributeF.create(key='services')
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=attr1, spec2__attribute=attr2,
+            spec3__attribute=attr3
+        )
+
+        output = StringIO()
+        call_command(
+            'import_csv', 'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            bulk=True, chunk_size=2, workers=2, stdout=output
+        )
+
+        self.assertEqual(Locality.objects.count(), 3)
+        self.assertEqual(Value.objects.count(), 8)
+
+        self.assertIn('Imported 3 rows', output.getvalue())
+
+    def test_import_csv_dry_run(self):
+
+        DomainSpecification3AF.create(
+            name='Test', spec1__attribute=AttributeF.create(key='name'),
+            spec2__attribute=AttributeF.create(key='url'),
+            spec3__attribute=AttributeF.create(key='services')
+        )
+
+        output = StringIO()
+        call_command(
+            'import_csv', 'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            dry_run=True, stdout=output
+        )
+
+        self.assertEqual(Locality.objects.count(), 0)
+
+        self.assertIn('Compared 3 rows', output.getvalue())
+        self.assertNotIn('Imported', output.getvalue())
+
     def test_import_csv_bad_arguments(self):
 
         self.assertRaises(
             CommandError, call_command, 'import_csv', 'Test', 'test_imp'
         )
+
+        self.assertRaises(
+            CommandError, call_command, 'import_csv', 'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            chunk_size=0
+        )
+
+        self.assertRaises(
+            CommandError, call_command, 'import_csv', 'Test', 'test_imp',
+            './localities/tests/test_data/test_csv_import_ok.csv',
+            './localities/tests/test_data/test_csv_import_map.json',
+            workers=0
+        )
+
+    @override_settings(
+        CLUSTER_PYRAMID_ZOOMS=[0, 1], CLUSTER_PYRAMID_ICONSIZES=((40, 40),)
+    )
+    def test_build_cluster_pyramid(self):
+        LocalityF.create()
+
+        call_command('build_cluster_pyramid')
+
+        self.assertListEqual(
+            list(LocalityCluster.objects.order_by('zoom').values_list(
+                'zoom', 'count'
+            )), [(0, 1), (1, 1)]
+        )
+
+    def test_export_localities(self):
+        domain = DomainF.create(name='Test')
+        LocalityF.create(domain=domain)
+        LocalityF.create(domain=domain)
+
+        handle, filename = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        self.addCleanup(os.remove, filename)
+
+        output = StringIO()
+        call_command(
+            'export_localities', 'Test', filename, format='csv',
+            stdout=output
+        )
+
+        self.assertIn('Exported 2 Localities', output.getvalue())
+
+        with open(filename) as exported:
+            # header and a row per Locality
+            self.assertEqual(len(exported.readlines()), 3)
+
+    def test_export_localities_missing_domain(self):
+
+        self.assertRaises(
+            CommandError, call_command, 'export_localities', 'Missing',
+            'export.csv'
+        )
+
+    def test_build_snapshots(self):
+        DomainF.create(name='Test')
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        output = StringIO()
+        with self.settings(MEDIA_ROOT=media_root, SNAPSHOT_FORMATS=('csv',)):
+            call_command('build_snapshots', stdout=output)
+
+        self.assertIn('Built snapshots of 1 Domains', output.getvalue())
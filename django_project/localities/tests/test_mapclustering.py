@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.core.exceptions import ImproperlyConfigured
 
 
 from .model_factories import LocalityF
@@ -8,7 +10,12 @@ from ..map_clustering import (
     within_bbox,
     cluster,
     overlapping_area,
-    update_minbbox
+    update_minbbox,
+    cluster_cell_size,
+    grid_cell,
+    find_cluster,
+    database_cluster,
+    get_cluster_backend
 )
 
 from ..models import Locality
@@ -49,6 +56,33 @@ class TestMapClustering(TestCase):
         self.assertListEqual(update_minbbox((1, -1), minbbox), [0, -1, 1, 0])
         self.assertListEqual(update_minbbox((1, 1), minbbox), [0, 0, 1, 1])
 
+    def test_cluster_cell_size(self):
+        self.assertEqual(
+            cluster_cell_size(zoom=0, pix_x=10, pix_y=10), (42.1875, 42.1875)
+        )
+
+        self.assertEqual(
+            cluster_cell_size(zoom=3, pix_x=10, pix_y=20),
+            (5.2734375, 10.546875)
+        )
+
+    def test_grid_cell(self):
+        self.assertEqual(grid_cell(0, 0, (10, 10)), (0, 0))
+        self.assertEqual(grid_cell(15, 25, (10, 10)), (1, 2))
+        self.assertEqual(grid_cell(-15, -0.5, (10, 10)), (-2, -1))
+
+    def test_find_cluster(self):
+        first = {'bbox': (-10, -10, 10, 10)}
+        second = {'bbox': (0, 0, 20, 20)}
+        grid = {(0, 0): [(1, second)], (-1, -1): [(0, first)]}
+
+        # both clusters contain the point, the oldest one is returned
+        self.assertIs(find_cluster(grid, (0, 0), 5, 5), first)
+        self.assertIs(find_cluster(grid, (1, 1), 15, 15), second)
+
+        # too far away from any of the clusters
+        self.assertIsNone(find_cluster(grid, (3, 3), 35, 35))
+
     def test_cluster(self):
 
         LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
@@ -92,3 +126,111 @@ class TestMapClustering(TestCase):
                     37.54223316717313, 37.54223316717313,
                     52.45776683282687, 52.45776683282687)}
         ])
+
+    def test_cluster_grid_boundaries(self):
+        # points on different sides of grid cell boundaries
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(-1 -1)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659161', geom='POINT(1 1)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659162', geom='POINT(-179 89)'
+        )
+
+        queryset = Locality.objects.order_by('id')
+
+        dict_cluster = cluster(queryset, 3, 40, 40)
+
+        self.assertEqual(
+            [(clu['uuid'], clu['count']) for clu in dict_cluster], [
+                ('93b7e8c4621a4597938dfd3d27659160', 2),
+                ('93b7e8c4621a4597938dfd3d27659162', 1)
+            ]
+        )
+
+    def test_cluster_no_iconsize(self):
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659161')
+
+        queryset = Locality.objects.all()
+
+        dict_cluster = cluster(queryset, 3, 0, 0)
+
+        self.assertEqual([clu['count'] for clu in dict_cluster], [1, 1])
+
+    def test_database_cluster(self):
+
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659161')
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659162')
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659164')
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659165')
+
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659166', geom='POINT(28 28)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659167', geom='POINT(30 30)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659168', geom='POINT(32 32)'
+        )
+
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659169', geom='POINT(45 45)'
+        )
+
+        queryset = Locality.objects.all()
+
+        dict_cluster = database_cluster(queryset, 3, 40, 40)
+
+        self.assertListEqual(dict_cluster, [
+            {'count': 5, 'minbbox': [0.0, 0.0, 0.0, 0.0], 'geom': (0.0, 0.0),
+                'uuid': '93b7e8c4621a4597938dfd3d27659160', 'bbox': (
+                    0.0, 0.0, 21.09375, 21.09375)},
+            {'count': 3, 'minbbox': [28.0, 28.0, 32.0, 32.0],
+                'geom': (28.0, 28.0),
+                'uuid': '93b7e8c4621a4597938dfd3d27659166',
+                'bbox': (21.09375, 21.09375, 42.1875, 42.1875)},
+            {'count': 1, 'minbbox': [45.0, 45.0, 45.0, 45.0],
+                'geom': (45.0, 45.0),
+                'uuid': '93b7e8c4621a4597938dfd3d27659169',
+                'bbox': (42.1875, 42.1875, 63.28125, 63.28125)}
+        ])
+
+        # Localities of every cluster are within its catchment area
+        for clu in dict_cluster:
+            self.assertTrue(clu['bbox'][0] <= clu['minbbox'][0])
+            self.assertTrue(clu['bbox'][1] <= clu['minbbox'][1])
+            self.assertTrue(clu['minbbox'][2] <= clu['bbox'][2])
+            self.assertTrue(clu['minbbox'][3] <= clu['bbox'][3])
+
+    def test_database_cluster_filtered(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(16 45)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659161', geom='POINT(-16 -45)'
+        )
+
+        queryset = Locality.objects.filter(
+            uuid='93b7e8c4621a4597938dfd3d27659161'
+        )
+
+        dict_cluster = database_cluster(queryset, 3, 40, 40)
+
+        self.assertEqual(
+            [(clu['uuid'], clu['count']) for clu in dict_cluster],
+            [('93b7e8c4621a4597938dfd3d27659161', 1)]
+        )
+
+    def test_get_cluster_backend(self):
+        self.assertIs(get_cluster_backend(), cluster)
+
+        with override_settings(CLUSTER_BACKEND='database'):
+            self.assertIs(get_cluster_backend(), database_cluster)
+
+        with override_settings(CLUSTER_BACKEND='unknown'):
+            self.assertRaises(ImproperlyConfigured, get_cluster_backend)
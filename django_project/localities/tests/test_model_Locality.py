@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
+import math
+
 from django.test import TestCase
 
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.gis.geos import GEOSGeometry
 
 from social_users.tests.model_factories import UserF
 
@@ -16,7 +20,8 @@ from .model_factories import (
     ChangesetF
 )
 
-from ..models import Locality
+from ..models import Locality, Value, ValueArchive
+from ..querysets import radius_bbox
 
 
 class TestModelLocality(TestCase):
@@ -146,6 +151,68 @@ class TestModelLocality(TestCase):
 
         self.assertEqual(len(chg_values), 1)
 
+    def test_set_values_versions_and_archives(self):
+        user = UserF(username='test', password='test')
+        attr1 = AttributeF.create(id=1, key='test')
+        attr2 = AttributeF.create(id=2, key='osm')
+
+        dom = DomainSpecification2AF.create(
+            name='a domain', spec1__attribute=attr1, spec2__attribute=attr2
+        )
+
+        locality = LocalityF.create(pk=1, domain=dom)
+
+        locality.set_values(
+            {'osm': 'osm val', 'test': 'test val'}, social_user=user
+        )
+        chg_values = locality.set_values(
+            {'osm': 'new osm val', 'test': 'test val'}, social_user=user
+        )
+
+        # only the changed value is updated
+        self.assertEqual(len(chg_values), 1)
+
+        value = Value.objects.get(
+            locality=locality, specification__attribute=attr2
+        )
+        self.assertEqual(value.data, 'new osm val')
+        self.assertEqual(value.version, 2)
+        self.assertEqual(value.changeset, chg_values[0][0].changeset)
+
+        self.assertEqual(ValueArchive.objects.count(), 3)
+        self.assertListEqual(
+            list(
+                ValueArchive.objects
+                .filter(object_id=value.pk)
+                .order_by('version')
+                .values_list('version', 'data')
+            ),
+            [(1, 'osm val'), (2, 'new osm val')]
+        )
+
+    def test_set_values_num_queries(self):
+        user = UserF(username='test', password='test')
+
+        def count_queries(domain, value_map):
+            locality = LocalityF.create(domain=domain)
+
+            with CaptureQueriesContext(connection) as queries:
+                locality.set_values(value_map, social_user=user)
+
+            return len(queries)
+
+        dom1 = DomainSpecification1AF.create(name='a domain')
+        dom4 = DomainSpecification4AF.create(name='a new domain')
+
+        keys1 = dom1.specification_set.values_list('attribute__key', flat=True)
+        keys4 = dom4.specification_set.values_list('attribute__key', flat=True)
+
+        # number of queries does not depend on the number of values
+        self.assertEqual(
+            count_queries(dom1, {key: 'val' for key in keys1}),
+            count_queries(dom4, {key: 'val' for key in keys4})
+        )
+
     def test_uuid_uniqueness(self):
         LocalityF.create(uuid='test_uuid')
 
@@ -188,6 +255,25 @@ class TestModelLocality(TestCase):
             u'uuid': '93b7e8c4621a4597938dfd3d27659162'
         })
 
+    def test_repr_dict_num_queries(self):
+        dom = DomainSpecification1AF.create(name='a domain')
+        locality = LocalityValue1F.create(
+            domain=dom, val1__specification=dom.specification_set.get()
+        )
+
+        self.assertNumQueries(1, locality.repr_dict)
+
+        dom = DomainSpecification4AF.create(name='a new domain')
+        specs = dom.specification_set.order_by('id')
+        locality = LocalityValue4F.create(
+            domain=dom, val1__specification=specs[0],
+            val2__specification=specs[1], val3__specification=specs[2],
+            val4__specification=specs[3]
+        )
+
+        self.assertEqual(len(locality.repr_dict()['values']), 4)
+        self.assertNumQueries(1, locality.repr_dict)
+
     def test_set_geom_method(self):
         loc = LocalityF.create(pk=1, geom='POINT (16 45)')
         loc.set_geom(10.0, 35.0)
@@ -248,3 +334,45 @@ class TestModelLocality(TestCase):
         self.assertEqual(locality.prepare_for_fts(), {
             u'A': u'1test 2test', u'D': u'3test 4test'
         })
+
+    def test_within_polygon(self):
+        LocalityF.create(pk=1, geom='POINT (16 45)')
+        LocalityF.create(pk=2, geom='POINT (16.5 45.5)')
+
+        polygon = GEOSGeometry(
+            'POLYGON ((15 44, 15 46, 16.2 46, 16.2 44, 15 44))', srid=4326
+        )
+
+        self.assertEqual(
+            list(
+                Locality.objects.within_polygon(polygon)
+                .values_list('pk', flat=True)
+            ), [1]
+        )
+
+    def test_within_radius(self):
+        LocalityF.create(pk=1, geom='POINT (16 45)')
+        # about 790 meters from the first Locality
+        LocalityF.create(pk=2, geom='POINT (16.01 45)')
+
+        self.assertEqual(
+            list(
+                Locality.objects.within_radius(16, 45, 500)
+                .values_list('pk', flat=True)
+            ), [1]
+        )
+        self.assertEqual(
+            Locality.objects.within_radius(16, 45, 1000).count(), 2
+        )
+
+    def test_radius_bbox(self):
+        self.assertEqual(
+            radius_bbox(16, 45, 110000).extent,
+            (16 - 1 / math.cos(math.radians(46)), 44.0,
+             16 + 1 / math.cos(math.radians(46)), 46.0)
+        )
+
+        # radius crosses the antimeridian
+        self.assertEqual(
+            radius_bbox(179.9, 0, 110000).extent, (-180.0, -1.0, 180.0, 1.0)
+        )
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+
+from ..models import LocalityCluster
+
+
+class TestModelLocalityCluster(TestCase):
+    def test_LocalityCluster_fields(self):
+        self.assertListEqual(
+            [fld.name for fld in LocalityCluster._meta.fields], [
+                u'id', 'zoom', 'pix_x', 'pix_y', 'cell_x', 'cell_y', 'uuid',
+                'count', 'geom', 'minbbox_minx', 'minbbox_miny',
+                'minbbox_maxx', 'minbbox_maxy'
+            ]
+        )
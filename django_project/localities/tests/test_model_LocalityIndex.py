@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.test import TestCase
 from django.db import connection
+from django.test.utils import override_settings
 
 from .model_factories import (
     DomainF,
@@ -11,6 +12,7 @@ from .model_factories import (
 )
 
 from ..models import LocalityIndex
+from ..indexing import update_locality_index
 
 
 class TestModelLocalityIndex(TestCase):
@@ -54,3 +56,47 @@ class TestModelLocalityIndex(TestCase):
 
         self.assertEqual(search.count(), 1)
         self.assertEqual([str(rec.locality) for rec in search], ['1'])
+
+    @override_settings(LOCALITY_INDEX_SQL=True)
+    def test_index_sql(self):
+        attr1 = AttributeF.create(key='test1')
+        attr2 = AttributeF.create(key='test2')
+        attr3 = AttributeF.create(key='test3')
+
+        dom = DomainF.create(name='domain')
+
+        SpecificationF.create(attribute=attr1, domain=dom, fts_rank='A')
+        SpecificationF.create(attribute=attr2, domain=dom, fts_rank='D')
+        SpecificationF.create(attribute=attr3, domain=dom, fts_rank='D')
+
+        loc = LocalityF.create(domain=dom)
+
+        loc.set_values(
+            {'test1': 'a name', 'test2': 'some', 'test3': 'data'},
+            loc.changeset.social_user
+        )
+
+        locind = LocalityIndex.objects.get(locality=loc)
+        self.assertEqual(
+            (locind.ranka, locind.rankb, locind.rankc, locind.rankd),
+            ('a name', '', '', 'some data')
+        )
+
+        loc.set_values({'test1': 'new name'}, loc.changeset.social_user)
+
+        # existing LocalityIndex is updated
+        self.assertEqual(
+            LocalityIndex.objects.get(locality=loc).ranka, 'new name'
+        )
+        self.assertEqual(LocalityIndex.objects.get(locality=loc).pk, locind.pk)
+
+    def test_update_locality_index_num_queries(self):
+        localities = [LocalityF.create(), LocalityF.create()]
+
+        self.assertNumQueries(
+            1, update_locality_index, [loc.pk for loc in localities]
+        )
+        self.assertEqual(LocalityIndex.objects.count(), 2)
+
+        # nothing to update
+        self.assertNumQueries(0, update_locality_index, [])
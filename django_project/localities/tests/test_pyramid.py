@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.contrib.gis.geos import Point
+
+from .model_factories import LocalityF
+
+from ..models import LocalityCluster
+from ..utils import parse_bbox
+from ..pyramid import (
+    pyramid_levels,
+    in_pyramid,
+    build_pyramid,
+    affected_cells,
+    deferred_updates,
+    pyramid_clusters
+)
+
+
+@override_settings(
+    CLUSTER_PYRAMID=True, CLUSTER_PYRAMID_ZOOMS=[3],
+    CLUSTER_PYRAMID_ICONSIZES=((40, 40),)
+)
+class TestPyramid(TestCase):
+    def _cell_counts(self):
+        return list(
+            LocalityCluster.objects.order_by('cell_x', 'cell_y')
+            .values_list('cell_x', 'cell_y', 'count')
+        )
+
+    def test_pyramid_levels(self):
+        self.assertEqual(pyramid_levels(), [(3, 40, 40)])
+
+        self.assertTrue(in_pyramid(3, 40, 40))
+        self.assertFalse(in_pyramid(4, 40, 40))
+        self.assertFalse(in_pyramid(3, 48, 46))
+
+        with override_settings(CLUSTER_PYRAMID=False):
+            self.assertFalse(in_pyramid(3, 40, 40))
+
+    def test_affected_cells(self):
+        self.assertEqual(
+            affected_cells([(0, 0), (28, 28), (-1, 1)]),
+            set([(3, 40, 40, (0, 0)), (3, 40, 40, (1, 1)),
+                 (3, 40, 40, (-1, 0))])
+        )
+
+    def test_build_pyramid(self):
+        with override_settings(CLUSTER_PYRAMID=False):
+            LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+            LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659161')
+            LocalityF.create(
+                uuid='93b7e8c4621a4597938dfd3d27659166', geom='POINT(28 28)'
+            )
+            LocalityF.create(
+                uuid='93b7e8c4621a4597938dfd3d27659167', geom='POINT(32 32)'
+            )
+            LocalityF.create(
+                uuid='93b7e8c4621a4597938dfd3d27659169', geom='POINT(45 45)'
+            )
+
+        self.assertEqual(LocalityCluster.objects.count(), 0)
+
+        build_pyramid()
+
+        self.assertEqual(
+            self._cell_counts(), [(0, 0, 2), (1, 1, 2), (2, 2, 1)]
+        )
+
+    def test_update_on_locality_changes(self):
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+        loc = LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659161')
+
+        self.assertEqual(self._cell_counts(), [(0, 0, 2)])
+
+        # move Locality to a different cell
+        loc.geom = Point(28, 28)
+        loc.save()
+
+        self.assertEqual(self._cell_counts(), [(0, 0, 1), (1, 1, 1)])
+
+        loc.delete()
+
+        self.assertEqual(self._cell_counts(), [(0, 0, 1)])
+
+    def test_deferred_updates(self):
+        with deferred_updates():
+            LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+            LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659161')
+
+            self.assertEqual(LocalityCluster.objects.count(), 0)
+
+        self.assertEqual(self._cell_counts(), [(0, 0, 2)])
+
+    def test_pyramid_clusters(self):
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659166', geom='POINT(28 28)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659167', geom='POINT(30 30)'
+        )
+
+        # cluster at (0, 0) is outside of the bbox, but its cell overlaps it
+        self.assertListEqual(
+            pyramid_clusters(parse_bbox('10,10,40,40'), 3, 40, 40), [
+                {'count': 1, 'minbbox': [0.0, 0.0, 0.0, 0.0],
+                    'geom': (0.0, 0.0),
+                    'uuid': '93b7e8c4621a4597938dfd3d27659160',
+                    'bbox': (
+                        -10.546875, -10.546875, 10.546875, 10.546875)},
+                {'count': 2, 'minbbox': [28.0, 28.0, 30.0, 30.0],
+                    'geom': (28.0, 28.0),
+                    'uuid': '93b7e8c4621a4597938dfd3d27659166',
+                    'bbox': (
+                        18.687662106566005, 18.687662106566005,
+                        37.31233789343399, 37.31233789343399)}
+            ]
+        )
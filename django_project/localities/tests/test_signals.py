@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.contrib.contenttypes.models import ContentType
+
+from .model_factories import (
+    DomainF,
+    AttributeF,
+    SpecificationF,
+    LocalityF,
+    ValueF
+)
+
+from ..models import Domain, Attribute, Specification, Locality, Value
+from ..signals import (
+    domain_archive_handler,
+    attribute_archive_handler,
+    specification_archive_handler,
+    locality_archive_handler,
+    value_archive_handler,
+    archive_localities,
+    archive_values
+)
+
+
+class TestSignals(TestCase):
+    def setUp(self):
+        # ContentTypes are cached for the lifetime of the process
+        for model in (Domain, Attribute, Specification, Locality, Value):
+            ContentType.objects.get_for_model(model)
+
+    def _assert_archive_queries(self, handler, model, factory):
+        # retrieve a fresh instance without any cached related objects
+        instance = model.objects.get(pk=factory.create().pk)
+
+        # archive is created using a single query
+        self.assertNumQueries(
+            1, handler, sender=model, instance=instance, created=False,
+            raw=False
+        )
+
+    def test_domain_archive_handler_num_queries(self):
+        self._assert_archive_queries(domain_archive_handler, Domain, DomainF)
+
+    def test_attribute_archive_handler_num_queries(self):
+        self._assert_archive_queries(
+            attribute_archive_handler, Attribute, AttributeF
+        )
+
+    def test_specification_archive_handler_num_queries(self):
+        self._assert_archive_queries(
+            specification_archive_handler, Specification, SpecificationF
+        )
+
+    def test_locality_archive_handler_num_queries(self):
+        self._assert_archive_queries(
+            locality_archive_handler, Locality, LocalityF
+        )
+
+    def test_value_archive_handler_num_queries(self):
+        self._assert_archive_queries(value_archive_handler, Value, ValueF)
+
+    def test_archive_localities_num_queries(self):
+        localities = [LocalityF.create(), LocalityF.create()]
+
+        self.assertNumQueries(1, archive_localities, localities)
+
+    def test_archive_values_num_queries(self):
+        values = [ValueF.create(), ValueF.create()]
+
+        self.assertNumQueries(1, archive_values, values)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import os
+import gzip
+import shutil
+import tempfile
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from .model_factories import DomainF, LocalityF
+
+from ..models import Locality
+from ..exceptions import LocalityExportError
+from ..exporters import EXPORTERS
+from ..snapshots import build_snapshots, load_manifest, snapshot_root
+
+
+class TestSnapshots(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, SNAPSHOT_FORMATS=('csv',)
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.domain = DomainF.create(name='Test Domain')
+        LocalityF.create(domain=self.domain)
+
+    def _snapshot(self):
+        return load_manifest(snapshot_root())['domains']['Test Domain'][
+            'formats']['csv']
+
+    def test_build_snapshots(self):
+        self.assertListEqual(build_snapshots(), ['Test Domain'])
+
+        snapshot = self._snapshot()
+        self.assertTrue(snapshot['filename'].startswith('test-domain-'))
+        self.assertEqual(snapshot['count'], 1)
+
+        snapshot_file = gzip.open(
+            os.path.join(snapshot_root(), snapshot['filename'])
+        )
+        # header and a row per Locality
+        self.assertEqual(len(snapshot_file.readlines()), 2)
+        snapshot_file.close()
+
+    def test_build_snapshots_unchanged(self):
+        build_snapshots()
+
+        # Domain has not changed since the previous build
+        self.assertListEqual(build_snapshots(), [])
+
+    def test_build_snapshots_force(self):
+        build_snapshots()
+        snapshot = self._snapshot()
+
+        self.assertListEqual(build_snapshots(force=True), ['Test Domain'])
+
+        # identical datasets have identical content hashes
+        self.assertEqual(self._snapshot()['sha256'], snapshot['sha256'])
+        self.assertTrue(os.path.exists(
+            os.path.join(snapshot_root(), snapshot['filename'])
+        ))
+
+    def test_build_snapshots_changed(self):
+        build_snapshots()
+        snapshot = self._snapshot()
+
+        LocalityF.create(domain=self.domain)
+
+        self.assertListEqual(build_snapshots(), ['Test Domain'])
+        self.assertEqual(self._snapshot()['count'], 2)
+
+        # previous snapshot is removed
+        self.assertFalse(os.path.exists(
+            os.path.join(snapshot_root(), snapshot['filename'])
+        ))
+
+    def test_build_snapshots_deleted(self):
+        build_snapshots()
+
+        # deletes do not create Changesets
+        Locality.objects.all().delete()
+
+        self.assertListEqual(build_snapshots(), ['Test Domain'])
+        self.assertEqual(self._snapshot()['count'], 0)
+
+    def test_build_snapshots_export_error(self):
+        def failing_exporter(output, keys):
+            raise LocalityExportError('Exporter is not available')
+
+        EXPORTERS['failing'] = failing_exporter
+        self.addCleanup(EXPORTERS.pop, 'failing')
+
+        with self.settings(SNAPSHOT_FORMATS=('csv', 'failing')):
+            self.assertListEqual(build_snapshots(), ['Test Domain'])
+
+        # other formats are built
+        self.assertListEqual(
+            load_manifest(snapshot_root())['domains']['Test Domain'][
+                'formats'].keys(), ['csv']
+        )
+        self.assertListEqual(
+            load_manifest(snapshot_root())['domains']['Test Domain'][
+                'failed'], ['failing']
+        )
+
+        # failed formats are not retried until the Domain changes
+        with self.settings(SNAPSHOT_FORMATS=('csv', 'failing')):
+            self.assertListEqual(build_snapshots(), [])
+
+            LocalityF.create(domain=self.domain)
+            self.assertListEqual(build_snapshots(), ['Test Domain'])
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.core.cache import cache
+
+from .model_factories import LocalityF
+
+from ..models import Locality
+from ..utils import parse_bbox
+from ..tiles import (
+    tile_for_lnglat,
+    tile_extent,
+    tiles_in_extent,
+    count_tiles,
+    tile_localities,
+    tiled_clusters
+)
+
+
+class TestTiles(TestCase):
+    def tearDown(self):
+        cache.clear()
+
+    def test_tile_for_lnglat(self):
+        self.assertEqual(tile_for_lnglat(0, 0, 1), (1, 1))
+        self.assertEqual(tile_for_lnglat(16, 45, 5), (17, 11))
+
+        # points outside of the map are clamped to the edge tiles
+        self.assertEqual(tile_for_lnglat(-180, 90, 1), (0, 0))
+        self.assertEqual(tile_for_lnglat(180, -90, 1), (1, 1))
+
+    def test_tile_extent(self):
+        extent = tile_extent(1, 0, 0)
+
+        self.assertEqual(extent[:3], (-180.0, 0.0, 0.0))
+        self.assertAlmostEqual(extent[3], 85.0511287798)
+
+    def test_tiles_in_extent(self):
+        self.assertListEqual(
+            tiles_in_extent((-10, -10, 10, 10), 2),
+            [(1, 1), (1, 2), (2, 1), (2, 2)]
+        )
+
+        self.assertListEqual(
+            tiles_in_extent((-250, -90, 250, 90), 1),
+            [(0, 0), (0, 1), (1, 0), (1, 1)]
+        )
+
+    def test_tile_localities(self):
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659161', geom='POINT(-1 1)'
+        )
+
+        # point on the tile edge belongs to the neighbouring tile
+        self.assertListEqual(
+            list(tile_localities(1, 0, 0).values_list('uuid', flat=True)),
+            ['93b7e8c4621a4597938dfd3d27659161']
+        )
+
+    @override_settings(CLUSTER_TILES=True)
+    def test_tiled_clusters(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(16 45)'
+        )
+        bbox = parse_bbox('-180,-90,180,90')
+
+        dict_cluster = tiled_clusters(bbox, 1, 40, 40)
+
+        self.assertEqual(
+            [(clu['uuid'], clu['count']) for clu in dict_cluster],
+            [('93b7e8c4621a4597938dfd3d27659160', 1)]
+        )
+
+        # adding a Locality invalidates tiles which contain it
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659161', geom='POINT(17 45)'
+        )
+
+        dict_cluster = tiled_clusters(bbox, 1, 40, 40)
+
+        self.assertEqual(
+            [(clu['uuid'], clu['count']) for clu in dict_cluster],
+            [('93b7e8c4621a4597938dfd3d27659160', 2)]
+        )
+
+    @override_settings(CLUSTER_TILES=True)
+    def test_tiled_clusters_cached(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(16 45)'
+        )
+        bbox = parse_bbox('-180,-90,180,90')
+
+        tiled_clusters(bbox, 1, 40, 40)
+
+        # bypass model signals, tiles are not invalidated
+        Locality.objects.all().update(uuid='93b7e8c4621a4597938dfd3d27659161')
+
+        dict_cluster = tiled_clusters(bbox, 1, 40, 40)
+
+        self.assertEqual(
+            [clu['uuid'] for clu in dict_cluster],
+            ['93b7e8c4621a4597938dfd3d27659160']
+        )
+
+        # other icon sizes are cached separately
+        dict_cluster = tiled_clusters(bbox, 1, 48, 46)
+
+        self.assertEqual(
+            [clu['uuid'] for clu in dict_cluster],
+            ['93b7e8c4621a4597938dfd3d27659161']
+        )
+
+    def test_count_tiles(self):
+        self.assertEqual(count_tiles((-10, -10, 10, 10), 2), 4)
+
+        # whole world at the maximum zoom level
+        self.assertEqual(count_tiles((-180, -90, 180, 90), 20), 4 ** 20)
+
+    @override_settings(CLUSTER_TILES=True, CLUSTER_TILE_MAX_TILES=3)
+    def test_tiled_clusters_max_tiles(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(16 45)'
+        )
+        bbox = parse_bbox('-180,-90,180,90')
+
+        # the bbox is clustered as a whole, tiles are not cached
+        dict_cluster = tiled_clusters(bbox, 1, 40, 40)
+
+        self.assertEqual(
+            [(clu['uuid'], clu['count']) for clu in dict_cluster],
+            [('93b7e8c4621a4597938dfd3d27659160', 1)]
+        )
+        self.assertIsNone(cache.get('localities:tile:1:1:0:40:40:0'))
@@ -1,7 +1,18 @@
 # -*- coding: utf-8 -*-
 from django.test import TestCase
 
-from ..utils import render_fragment, parse_bbox
+from .model_factories import LocalityF, DomainF
+
+from ..models import Locality
+from ..utils import (
+    render_fragment,
+    render_domain_fragment,
+    parse_bbox,
+    decode_polyline,
+    parse_polygon,
+    server_side_iterator,
+    _FRAGMENT_TEMPLATES
+)
 
 
 class TestUtils(TestCase):
@@ -11,6 +22,38 @@ class TestUtils(TestCase):
 
         self.assertEqual(render_fragment(template, context), u'test test')
 
+    def test_render_domain_fragment(self):
+        domain = DomainF.create(template_fragment='test {{ obj.data }}')
+        context = {'obj': {'data': 'test'}}
+
+        self.assertEqual(
+            render_domain_fragment(domain, context), u'test test'
+        )
+
+        # compiled template is reused
+        template = _FRAGMENT_TEMPLATES[domain.pk][1]
+        render_domain_fragment(domain, context)
+        self.assertIs(_FRAGMENT_TEMPLATES[domain.pk][1], template)
+
+        # saving a Domain removes compiled template
+        domain.template_fragment = 'new {{ obj.data }}'
+        domain.save()
+        self.assertNotIn(domain.pk, _FRAGMENT_TEMPLATES)
+
+        self.assertEqual(render_domain_fragment(domain, context), u'new test')
+
+    def test_render_domain_fragment_version(self):
+        domain = DomainF.create(template_fragment='test {{ obj.data }}')
+        context = {'obj': {'data': 'test'}}
+
+        render_domain_fragment(domain, context)
+
+        # Domain changed in a different process
+        domain.template_fragment = 'new {{ obj.data }}'
+        domain.version += 1
+
+        self.assertEqual(render_domain_fragment(domain, context), u'new test')
+
     def test_parse_bbox(self):
         self.assertRaises(ValueError, parse_bbox, '-180,90,-a,-b')
 
@@ -19,6 +62,8 @@ class TestUtils(TestCase):
 
         self.assertRaises(ValueError, parse_bbox, '180,-90,-180,90')
 
+        self.assertRaises(ValueError, parse_bbox, '-180,-90')
+
     def test_parse_bbox_return(self):
         self.assertEqual(
             parse_bbox('-180,-90,180,90').wkt,
@@ -27,3 +72,48 @@ class TestUtils(TestCase):
             u'000000000, 180.0000000000000000 -90.0000000000000000, -180.00000'
             u'00000000000 -90.0000000000000000))'
         )
+
+    def test_server_side_iterator(self):
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659160')
+        LocalityF.create(uuid='93b7e8c4621a4597938dfd3d27659161')
+
+        localities = (
+            Locality.objects.order_by('uuid').get_lnglat()
+            .values('uuid', 'lnglat')
+        )
+
+        self.assertListEqual(
+            list(server_side_iterator(localities, chunk_size=1)),
+            list(localities)
+        )
+
+    def test_decode_polyline(self):
+        self.assertEqual(
+            decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@'),
+            [(-120.2, 38.5), (-120.95, 40.7), (-126.453, 43.252)]
+        )
+
+    def test_decode_polyline_truncated(self):
+        self.assertRaises(ValueError, decode_polyline, '_p~iF~ps|U_ulL')
+
+    def test_parse_polygon(self):
+        wkt = 'POLYGON ((0 0, 0 1, 1 1, 0 0))'
+
+        polygon = parse_polygon(wkt)
+        self.assertEqual(polygon.wkt, wkt)
+        self.assertEqual(polygon.srid, 4326)
+
+        polygon = parse_polygon(
+            '{"type": "Polygon", "coordinates": '
+            '[[[0, 0], [0, 1], [1, 1], [0, 0]]]}'
+        )
+        self.assertEqual(polygon.wkt, wkt)
+
+        # ring of an encoded polyline is closed
+        polygon = parse_polygon('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(polygon.num_coords, 4)
+        self.assertEqual(polygon.srid, 4326)
+
+    def test_parse_polygon_bad_input(self):
+        self.assertRaises(ValueError, parse_polygon, 'POINT (0 0)')
+        self.assertRaises(Exception, parse_polygon, '_p~iF')
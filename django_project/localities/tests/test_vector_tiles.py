@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import mapbox_vector_tile
+
+from django.test import TestCase, Client
+from django.core.urlresolvers import reverse
+
+from .model_factories import LocalityF
+
+from ..vector_tiles import lnglat_to_mercator, tile_mercator_extent
+
+
+class TestVectorTiles(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def _get_features(self, zoom, x, y):
+        resp = self.client.get(reverse(
+            'localities-tile', kwargs={'zoom': zoom, 'x': x, 'y': y}
+        ))
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/x-protobuf')
+
+        tile = mapbox_vector_tile.decode(resp.content)
+
+        return [
+            feature['properties']
+            for feature in tile.get('localities', {}).get('features', [])
+        ]
+
+    def test_lnglat_to_mercator(self):
+        self.assertEqual(lnglat_to_mercator(0, 0), (0.0, 0.0))
+
+        mercx, mercy = lnglat_to_mercator(180, 85.0511287798)
+
+        self.assertAlmostEqual(mercx, 20037508.342789244)
+        self.assertAlmostEqual(mercy, 20037508.342789244, places=2)
+
+    def test_tile_mercator_extent(self):
+        extent = tile_mercator_extent(1, 1, 1)
+
+        self.assertAlmostEqual(extent[0], 0.0)
+        self.assertAlmostEqual(extent[1], -20037508.342789244, places=2)
+        self.assertAlmostEqual(extent[2], 20037508.342789244)
+        self.assertAlmostEqual(extent[3], 0.0)
+
+    def test_localities_tile_clusters(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(16 45)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659161', geom='POINT(17 45)'
+        )
+
+        self.assertEqual(self._get_features(1, 1, 0), [{
+            'uuid': '93b7e8c4621a4597938dfd3d27659160', 'count': 2,
+            'minbbox': '16.0,45.0,17.0,45.0'
+        }])
+
+        # nothing in the southern hemisphere
+        self.assertEqual(self._get_features(1, 1, 1), [])
+
+    def test_localities_tile_points(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659160', geom='POINT(16 45)'
+        )
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659161', geom='POINT(16.001 45)'
+        )
+
+        self.assertEqual(
+            sorted(
+                feature['uuid'] for feature in self._get_features(9, 278, 184)
+            ), [
+                '93b7e8c4621a4597938dfd3d27659160',
+                '93b7e8c4621a4597938dfd3d27659161'
+            ]
+        )
+
+    def test_localities_tile_bad_params(self):
+        resp = self.client.get(reverse(
+            'localities-tile', kwargs={'zoom': 1, 'x': 2, 'y': 0}
+        ))
+
+        self.assertEqual(resp.status_code, 404)
+
+        resp = self.client.get(reverse(
+            'localities-tile', kwargs={'zoom': 21, 'x': 0, 'y': 0}
+        ))
+
+        self.assertEqual(resp.status_code, 404)
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
+import json
+
 from django.test import TestCase, Client
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from django.core.cache import cache
 
 from social_users.tests.model_factories import UserF
 
@@ -20,6 +24,7 @@ from ..models import Locality
 class TestViews(TestCase):
     def setUp(self):
         self.client = Client()
+        cache.clear()
 
     def test_localities_view(self):
         LocalityF.create(
@@ -43,6 +48,89 @@ class TestViews(TestCase):
             )
         )
 
+    @override_settings(CLUSTER_BACKEND='database')
+    def test_localities_view_database_backend(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659162', geom='POINT(16 45)'
+        )
+        resp = self.client.get(reverse('localities'), data={
+            'zoom': 1,
+            'bbox': '-180,-90,180,90',
+            'iconsize': '40,40'
+        })
+
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(
+            resp.content, (
+                u'[{"count": 1, "minbbox": [16.0, 45.0, 16.0, 45.0], "geom": ['
+                u'16.0, 45.0], "uuid": "93b7e8c4621a4597938dfd3d27659162", "bb'
+                u'ox": [-13.831067331307473, 15.168932668692527, 45.8310673313'
+                u'0747, 74.83106733130748]}]'
+            )
+        )
+
+    @override_settings(CLUSTER_TILES=True)
+    def test_localities_view_tiles(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659162', geom='POINT(16 45)'
+        )
+        resp = self.client.get(reverse('localities'), data={
+            'zoom': 1,
+            'bbox': '-10,-10,20,50',
+            'iconsize': '40,40'
+        })
+
+        self.assertEqual(resp.status_code, 200)
+
+        self.assertEqual(
+            resp.content, (
+                u'[{"count": 1, "minbbox": [16.0, 45.0, 16.0, 45.0], "geom": ['
+                u'16.0, 45.0], "uuid": "93b7e8c4621a4597938dfd3d27659162", "bb'
+                u'ox": [-13.831067331307473, 15.168932668692527, 45.8310673313'
+                u'0747, 74.83106733130748]}]'
+            )
+        )
+
+    @override_settings(CLUSTER_TILES=True)
+    def test_localities_view_spatial_filters(self):
+        LocalityF.create(
+            uuid='93b7e8c4621a4597938dfd3d27659162', geom='POINT(16 45)'
+        )
+        LocalityF.create(geom='POINT(20 45)')
+
+        # encoded polyline of a (15 44, 15 46, 17 46, 17 44) polygon
+        resp = self.client.get(reverse('localities'), data={
+            'zoom': 1,
+            'bbox': '-180,-90,180,90',
+            'iconsize': '40,40',
+            'polygon': '_wpkG_upzA_seK??_seK~reK?'
+        })
+
+        self.assertEqual(resp.status_code, 200)
+
+        clusters = json.loads(resp.content)
+        self.assertEqual(
+            [(clu['uuid'], clu['count']) for clu in clusters],
+            [(u'93b7e8c4621a4597938dfd3d27659162', 1)]
+        )
+
+        resp = self.client.get(reverse('localities'), data={
+            'zoom': 1,
+            'bbox': '-180,-90,180,90',
+            'iconsize': '40,40',
+            'center': '20,45',
+            'radius': '1000'
+        })
+
+        self.assertEqual(
+            [clu['count'] for clu in json.loads(resp.content)], [1]
+        )
+        self.assertNotEqual(
+            json.loads(resp.content)[0]['uuid'],
+            u'93b7e8c4621a4597938dfd3d27659162'
+        )
+
     def test_localities_view_bad_params(self):
         resp = self.client.get(reverse('localities'), data={
             'bbox': '-180,-90,180,90'
@@ -107,6 +195,43 @@ class TestViews(TestCase):
             )
         )
 
+    def test_localitiesInfo_view_etag(self):
+        user = UserF(username='test', password='test')
+        test_attr = AttributeF.create(key='test')
+
+        dom = DomainSpecification1AF(
+            template_fragment='Test value: {{ values.test }}',
+            spec1__attribute=test_attr
+        )
+        loc = LocalityValue1F.create(
+            geom='POINT(16 45)', uuid='93b7e8c4621a4597938dfd3d27659162',
+            val1__specification__attribute=test_attr, val1__data='osm',
+            domain=dom
+        )
+        url = reverse(
+            'locality-info', kwargs={
+                'uuid': '93b7e8c4621a4597938dfd3d27659162'
+            }
+        )
+
+        resp = self.client.get(url)
+        etag = resp['ETag']
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+        self.assertEqual(resp.content, '')
+
+        # updating values invalidates cached representation
+        loc.set_values({'test': 'new osm'}, social_user=user)
+
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertIn('"repr": "Test value: new osm"', resp.content)
+
     def test_localitiesUpdate_form_get_no_user(self):
         resp = self.client.get(reverse(
             'locality-update', kwargs={
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import math
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.gis.geos import Polygon
+
+from .models import Locality
+from .map_clustering import get_cluster_backend
+
+# map views are using WebMercator tiles, limited to +/- 85.0511 degrees
+MAX_LAT = 85.0511287798
+MAX_ZOOM = 20
+
+
+def tile_for_lnglat(lng, lat, zoom):
+    """
+    Calculate XYZ tile (x, y) which contains a point (lng, lat) at a zoom
+    """
+
+    num_tiles = 2 ** zoom
+
+    lng = min(max(lng, -180.0), 180.0)
+    lat = math.radians(min(max(lat, -MAX_LAT), MAX_LAT))
+
+    tile_x = int((lng + 180.0) / 360.0 * num_tiles)
+    tile_y = int(
+        (1.0 - math.log(math.tan(lat) + 1.0 / math.cos(lat)) / math.pi) / 2.0
+        * num_tiles
+    )
+
+    return (
+        min(max(tile_x, 0), num_tiles - 1),
+        min(max(tile_y, 0), num_tiles - 1)
+    )
+
+
+def tile_extent(zoom, x, y):
+    """
+    Calculate extent (minx, miny, maxx, maxy) of a XYZ tile
+    """
+
+    num_tiles = 2.0 ** zoom
+
+    def tile_lat(tile_y):
+        return math.degrees(
+            math.atan(math.sinh(math.pi * (1 - 2 * tile_y / num_tiles)))
+        )
+
+    return (
+        x / num_tiles * 360.0 - 180.0, tile_lat(y + 1),
+        (x + 1) / num_tiles * 360.0 - 180.0, tile_lat(y)
+    )
+
+
+def _tile_range(extent, zoom):
+    min_x, min_y = tile_for_lnglat(extent[0], extent[3], zoom)
+    max_x, max_y = tile_for_lnglat(extent[2], extent[1], zoom)
+
+    return min_x, min_y, max_x, max_y
+
+
+def count_tiles(extent, zoom):
+    """
+    Count XYZ tiles which cover an extent (minx, miny, maxx, maxy)
+    """
+
+    min_x, min_y, max_x, max_y = _tile_range(extent, zoom)
+
+    return (max_x - min_x + 1) * (max_y - min_y + 1)
+
+
+def tiles_in_extent(extent, zoom):
+    """
+    List XYZ tiles (x, y) which cover an extent (minx, miny, maxx, maxy)
+    """
+
+    min_x, min_y, max_x, max_y = _tile_range(extent, zoom)
+
+    return [
+        (tile_x, tile_y)
+        for tile_x in range(min_x, max_x + 1)
+        for tile_y in range(min_y, max_y + 1)
+    ]
+
+
+def tile_localities(zoom, x, y):
+    """
+    Filter Localities within a XYZ tile
+
+    Points on the right and top tile edges belong to neighbouring tiles
+    """
+
+    extent = tile_extent(zoom, x, y)
+
+    return Locality.objects.in_bbox(Polygon.from_bbox(extent)).extra(
+        where=['st_x(geom) < %s', 'st_y(geom) < %s'],
+        params=[extent[2], extent[3]]
+    )
+
+
+def _generation_key(zoom, x, y):
+    return 'localities:tile:{}:{}:{}'.format(zoom, x, y)
+
+
+def _clusters_key(zoom, x, y, pix_x, pix_y, generation):
+    return 'localities:tile:{}:{}:{}:{}:{}:{}'.format(
+        zoom, x, y, pix_x, pix_y, generation
+    )
+
+
+def clusters_for_tiles(tiles, zoom, pix_x, pix_y):
+    """
+    Create point clusters for every XYZ tile (x, y) in a list of tiles
+
+    Clusters of a tile are cached in the *CLUSTER_TILE_CACHE* cache, under a
+    key which includes tile generation, so only tiles which are not cached or
+    which were invalidated by *invalidate_tiles* are clustered
+    """
+
+    cache = caches[settings.CLUSTER_TILE_CACHE]
+    cluster = get_cluster_backend()
+
+    generations = cache.get_many(
+        [_generation_key(zoom, x, y) for x, y in tiles]
+    )
+    keys = {
+        (x, y): _clusters_key(
+            zoom, x, y, pix_x, pix_y,
+            generations.get(_generation_key(zoom, x, y), 0)
+        )
+        for x, y in tiles
+    }
+    cached_tiles = cache.get_many(keys.values())
+
+    object_list = []
+    new_tiles = {}
+
+    for tile in tiles:
+        tile_clusters = cached_tiles.get(keys[tile])
+
+        if tile_clusters is None:
+            tile_clusters = cluster(
+                tile_localities(zoom, *tile), zoom, pix_x, pix_y
+            )
+            new_tiles[keys[tile]] = tile_clusters
+
+        object_list.extend(tile_clusters)
+
+    if new_tiles:
+        LOG.debug('Caching %s clustered tiles', len(new_tiles))
+        cache.set_many(new_tiles, settings.CLUSTER_TILE_TIMEOUT)
+
+    return object_list
+
+
+def tiled_clusters(bbox, zoom, pix_x, pix_y):
+    """
+    Create point clusters for every XYZ tile in a bbox
+
+    A bbox covered by more than *CLUSTER_TILE_MAX_TILES* tiles is clustered
+    as a whole, without caching
+    """
+
+    if count_tiles(bbox.extent, zoom) > settings.CLUSTER_TILE_MAX_TILES:
+        LOG.debug('Too many tiles at zoom %s, clustering the bbox', zoom)
+        cluster = get_cluster_backend()
+        return cluster(Locality.objects.in_bbox(bbox), zoom, pix_x, pix_y)
+
+    return clusters_for_tiles(
+        tiles_in_extent(bbox.extent, zoom), zoom, pix_x, pix_y
+    )
+
+
+def invalidate_tiles(points):
+    """
+    Invalidate cached clusters of XYZ tiles, at every zoom level, which
+    contain points (geomx, geomy) of changed Localities
+
+    Invalidated tiles get a new generation, previously cached clusters will
+    expire after *CLUSTER_TILE_TIMEOUT*
+    """
+
+    if not(settings.CLUSTER_TILES):
+        return
+
+    cache = caches[settings.CLUSTER_TILE_CACHE]
+    generation = uuid.uuid4().hex
+
+    cache.set_many({
+        _generation_key(zoom, *tile_for_lnglat(geomx, geomy, zoom)): generation
+        for zoom in range(MAX_ZOOM + 1)
+        for geomx, geomy in points
+    }, None)
@@ -3,6 +3,7 @@ from django.conf.urls import patterns, url
 
 from .views import (
     LocalitiesLayer,
+    LocalitiesTile,
     LocalityInfo,
     LocalityUpdate,
     LocalityCreate
@@ -14,6 +15,10 @@ urlpatterns = patterns(
         r'^localities.json$', LocalitiesLayer.as_view(),
         name='localities'
     ),
+    url(
+        r'^tiles/localities/(?P<zoom>\d+)/(?P<x>\d+)/(?P<y>\d+)\.mvt$',
+        LocalitiesTile.as_view(), name='localities-tile'
+    ),
     url(
         r'^localities/(?P<uuid>\w{32})$', LocalityInfo.as_view(),
         name='locality-info'
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
+import uuid
+
 from django.template import Template, Context
-from django.contrib.gis.geos import Polygon
+from django.contrib.gis.geos import Polygon, GEOSGeometry
+from django.db import connection, transaction
+
+# compiled Domain template fragments, {domain_id: (domain_version, Template)}
+_FRAGMENT_TEMPLATES = {}
 
 
 def render_fragment(template, context):
@@ -13,6 +19,31 @@ def render_fragment(template, context):
     return t.render(c)
 
 
+def render_domain_fragment(domain, context):
+    """
+    Render a Domain template fragment using provided context
+
+    Template fragment is compiled once and reused until the Domain version
+    changes
+    """
+
+    cached = _FRAGMENT_TEMPLATES.get(domain.pk)
+
+    if cached is None or cached[0] != domain.version:
+        cached = (domain.version, Template(domain.template_fragment))
+        _FRAGMENT_TEMPLATES[domain.pk] = cached
+
+    return cached[1].render(Context(context))
+
+
+def invalidate_domain_fragment(domain_id):
+    """
+    Remove a compiled Domain template fragment
+    """
+
+    _FRAGMENT_TEMPLATES.pop(domain_id, None)
+
+
 def parse_bbox(bbox):
     """
     Convert a textual bbox to a GEOS polygon object
@@ -22,8 +53,105 @@ def parse_bbox(bbox):
 
     tmp_bbox = map(float, bbox.split(','))
 
+    if len(tmp_bbox) != 4:
+        raise ValueError('Bbox requires 4 coordinates')
     if tmp_bbox[0] > tmp_bbox[2] or tmp_bbox[1] > tmp_bbox[3]:
             # bbox is not properly formatted minLng, minLat, maxLng, maxLat
             raise ValueError
     # create polygon from bbox
     return Polygon.from_bbox(tmp_bbox)
+
+
+def decode_polyline(encoded, precision=5):
+    """
+    Decode an encoded polyline to a list of (lng, lat) coordinates
+
+    https://developers.google.com/maps/documentation/utilities/polylinealgorithm  # noqa
+    """
+
+    coords = []
+    index = lat = lng = 0
+    factor = float(10 ** precision)
+
+    while index < len(encoded):
+        deltas = []
+        # every point is encoded as a (lat, lng) offset to the previous point
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= len(encoded):
+                    raise ValueError('Truncated polyline')
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+
+        lat += deltas[0]
+        lng += deltas[1]
+        coords.append((lng / factor, lat / factor))
+
+    return coords
+
+
+def parse_polygon(text):
+    """
+    Convert a textual polygon, either GeoJSON, WKT or an encoded polyline of
+    the polygon exterior ring, to a GEOS geometry object
+
+    This function assumes that any raised exceptions will be handled upstream
+    """
+
+    text = text.strip()
+
+    if text.startswith('{') or text[:12].upper().startswith(
+            ('POLYGON', 'MULTIPOLYGON', 'SRID=')):
+        geom = GEOSGeometry(text)
+    else:
+        ring = decode_polyline(text)
+        if ring and ring[0] != ring[-1]:
+            # close the ring
+            ring.append(ring[0])
+        geom = Polygon(ring)
+
+    if geom.geom_type not in ('Polygon', 'MultiPolygon'):
+        raise ValueError('Not a polygon: {}'.format(geom.geom_type))
+
+    if geom.srid is None:
+        geom.srid = 4326
+
+    return geom
+
+
+def server_side_iterator(values_queryset, chunk_size=2000):
+    """
+    Iterate through a values queryset using a PostgreSQL server side cursor
+
+    Rows are transferred from the database in chunks of *chunk_size* rows, so
+    memory usage doesn't depend on the number of rows in the queryset
+    """
+
+    # same column order as used by ValuesQuerySet.iterator
+    names = (
+        list(values_queryset.query.extra_select) +
+        list(values_queryset.field_names) +
+        list(values_queryset.query.aggregate_select)
+    )
+    sql, params = values_queryset.query.sql_with_params()
+
+    # named (server side) cursors can only be used in a transaction
+    with transaction.atomic():
+        connection.ensure_connection()
+        cursor = connection.connection.cursor(
+            name='server_side_{}'.format(uuid.uuid4().hex)
+        )
+        cursor.itersize = chunk_size
+
+        try:
+            cursor.execute(sql, params)
+            for row in cursor:
+                yield dict(zip(names, row))
+        finally:
+            cursor.close()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import logging
+LOG = logging.getLogger(__name__)
+
+import math
+
+import mapbox_vector_tile
+
+from django.conf import settings
+
+from .map_clustering import get_cluster_backend
+from .tiles import tile_extent, tile_localities, clusters_for_tiles
+
+EARTH_RADIUS = 6378137.0
+
+
+def lnglat_to_mercator(lng, lat):
+    """
+    Project a point (lng, lat) to WebMercator (EPSG:3857) coordinates
+    """
+
+    return (
+        EARTH_RADIUS * math.radians(lng),
+        EARTH_RADIUS * math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+    )
+
+
+def tile_mercator_extent(zoom, x, y):
+    """
+    Calculate WebMercator extent (minx, miny, maxx, maxy) of a XYZ tile
+    """
+
+    extent = tile_extent(zoom, x, y)
+
+    return (
+        lnglat_to_mercator(extent[0], extent[1]) +
+        lnglat_to_mercator(extent[2], extent[3])
+    )
+
+
+def _point_feature(geomx, geomy, properties):
+    return {
+        'geometry': 'POINT ({!r} {!r})'.format(
+            *lnglat_to_mercator(geomx, geomy)
+        ),
+        'properties': properties
+    }
+
+
+def cluster_features(zoom, x, y):
+    """
+    Create vector tile features for clusters of Localities in a XYZ tile
+    """
+
+    pix_x, pix_y = settings.TILE_ICONSIZE
+
+    if settings.CLUSTER_TILES:
+        # reuse cached clusters of the tile
+        clusters = clusters_for_tiles([(x, y)], zoom, pix_x, pix_y)
+    else:
+        cluster = get_cluster_backend()
+        clusters = cluster(tile_localities(zoom, x, y), zoom, pix_x, pix_y)
+
+    return [
+        _point_feature(clu['geom'][0], clu['geom'][1], {
+            'uuid': clu['uuid'],
+            'count': clu['count'],
+            'minbbox': ','.join(str(coord) for coord in clu['minbbox'])
+        })
+        for clu in clusters
+    ]
+
+
+def point_features(zoom, x, y):
+    """
+    Create vector tile features for every Locality in a XYZ tile
+    """
+
+    localities = (
+        tile_localities(zoom, x, y).get_lnglat().values('uuid', 'lnglat')
+    )
+
+    features = []
+
+    for locality in localities.iterator():
+        geomx, geomy = map(float, locality['lnglat'].split(','))
+
+        features.append(_point_feature(geomx, geomy, {
+            'uuid': locality['uuid'],
+            'count': 1
+        }))
+
+    return features
+
+
+def encode_tile(zoom, x, y):
+    """
+    Encode Localities in a XYZ tile as a Mapbox Vector Tile
+
+    Localities are clustered below the *TILE_POINTS_ZOOM* zoom level
+    """
+
+    if zoom < settings.TILE_POINTS_ZOOM:
+        features = cluster_features(zoom, x, y)
+    else:
+        features = point_features(zoom, x, y)
+
+    return mapbox_vector_tile.encode(
+        [{'name': 'localities', 'features': features}],
+        quantize_bounds=tile_mercator_extent(zoom, x, y)
+    )
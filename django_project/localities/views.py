@@ -4,26 +4,35 @@ LOG = logging.getLogger(__name__)
 
 import uuid
 
-from django.views.generic import DetailView, ListView, FormView
+from django.views.generic import DetailView, ListView, FormView, View
 from django.views.generic.detail import SingleObjectMixin
 from django.http import HttpResponse, Http404
 from django.contrib.gis.geos import Point
 from django.db import transaction
+from django.conf import settings
+from django.utils.cache import patch_cache_control
 
 from braces.views import JSONResponseMixin, LoginRequiredMixin
 
 from .models import Locality, Domain, Changeset
-from .utils import render_fragment, parse_bbox
+from .utils import render_domain_fragment, parse_bbox
 from .forms import LocalityForm, DomainForm
 
-from .map_clustering import cluster
+from .map_clustering import get_cluster_backend
+from .pyramid import in_pyramid, pyramid_clusters
+from .tiles import tiled_clusters, MAX_ZOOM
+from .vector_tiles import encode_tile
+from .caching import CachedDetailMixin
+from .mixins import SpatialFilterMixin
+from .archives import deferred_archives
 
 
-class LocalitiesLayer(JSONResponseMixin, ListView):
+class LocalitiesLayer(SpatialFilterMixin, JSONResponseMixin, ListView):
     """
     Returns JSON representation of clustered points for the current map view
 
-    Map view is defined by a *bbox*, *zoom* and *iconsize*
+    Map view is defined by a *bbox*, *zoom* and *iconsize*, Localities can be
+    filtered using spatial filters of the *SpatialFilterMixin*
     """
 
     def _parse_request_params(self, request):
@@ -57,14 +66,60 @@ class LocalitiesLayer(JSONResponseMixin, ListView):
     def get(self, request, *args, **kwargs):
         # parse request params
         bbox, zoom, iconsize = self._parse_request_params(request)
-
-        # cluster Localites for a view
-        object_list = cluster(Locality.objects.in_bbox(bbox), zoom, *iconsize)
+        filters = self._parse_spatial_filters(request)
+
+        if filters:
+            # precomputed clusters are not filtered, cluster for a view
+            cluster = get_cluster_backend()
+            object_list = cluster(
+                self.apply_spatial_filters(
+                    Locality.objects.in_bbox(bbox), filters
+                ), zoom, *iconsize
+            )
+        elif in_pyramid(zoom, *iconsize):
+            # use precomputed clusters
+            object_list = pyramid_clusters(bbox, zoom, *iconsize)
+        elif settings.CLUSTER_TILES:
+            # cluster and cache Localities per map tile
+            object_list = tiled_clusters(bbox, zoom, *iconsize)
+        else:
+            # cluster Localites for a view
+            cluster = get_cluster_backend()
+            object_list = cluster(
+                Locality.objects.in_bbox(bbox), zoom, *iconsize
+            )
 
         return self.render_json_response(object_list)
 
 
-class LocalityInfo(JSONResponseMixin, DetailView):
+class LocalitiesTile(View):
+    """
+    Returns Mapbox Vector Tile representation of Localities in a XYZ tile
+
+    Tile is defined by *zoom*, *x* and *y*
+    """
+
+    def get(self, request, *args, **kwargs):
+        zoom = int(kwargs['zoom'])
+        tile_x = int(kwargs['x'])
+        tile_y = int(kwargs['y'])
+
+        if zoom > MAX_ZOOM or tile_x >= 2 ** zoom or tile_y >= 2 ** zoom:
+            # tile is not on the map
+            raise Http404
+
+        response = HttpResponse(
+            encode_tile(zoom, tile_x, tile_y),
+            content_type='application/x-protobuf'
+        )
+        patch_cache_control(
+            response, public=True, max_age=settings.TILE_MAX_AGE
+        )
+
+        return response
+
+
+class LocalityInfo(CachedDetailMixin, JSONResponseMixin, DetailView):
     """
     Returns JSON representation of an Locality object (repr_dict) and a
     rendered template fragment (repr)
@@ -73,6 +128,7 @@ class LocalityInfo(JSONResponseMixin, DetailView):
     model = Locality
     slug_field = 'uuid'
     slug_url_kwarg = 'uuid'
+    detail_prefix = 'info'
 
     def get_queryset(self):
         queryset = (
@@ -80,15 +136,12 @@ class LocalityInfo(JSONResponseMixin, DetailView):
         )
         return queryset
 
-    def get(self, request, *args, **kwargs):
-        self.object = self.get_object()
+    def get_detail(self):
         obj_repr = self.object.repr_dict()
-        data_repr = render_fragment(
-            self.object.domain.template_fragment, obj_repr
-        )
+        data_repr = render_domain_fragment(self.object.domain, obj_repr)
         obj_repr.update({'repr': data_repr})
 
-        return self.render_json_response(obj_repr)
+        return obj_repr
 
 
 class LocalityUpdate(LoginRequiredMixin, SingleObjectMixin, FormView):
@@ -118,8 +171,8 @@ class LocalityUpdate(LoginRequiredMixin, SingleObjectMixin, FormView):
         return super(LocalityUpdate, self).post(request, *args, **kwargs)
 
     def form_valid(self, form):
-        # update everything in one transaction
-        with transaction.atomic():
+        # update everything in one transaction, archives are saved at the end
+        with transaction.atomic(), deferred_archives():
             self.object.set_geom(
                 form.cleaned_data.pop('lon'),
                 form.cleaned_data.pop('lat')
@@ -175,8 +228,8 @@ class LocalityCreate(LoginRequiredMixin, SingleObjectMixin, FormView):
         return super(LocalityCreate, self).post(request, *args, **kwargs)
 
     def form_valid(self, form):
-        # create new as a single transaction
-        with transaction.atomic():
+        # create new as a single transaction, archives are saved at the end
+        with transaction.atomic(), deferred_archives():
             tmp_changeset = Changeset.objects.create(
                 social_user=self.request.user
             )